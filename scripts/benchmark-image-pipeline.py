@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+HiKo 이미지 파이프라인 벤치마크
+합성 입력(JPEG/알파 PNG, 대/소, 가로/세로)으로 리사이즈 경로별 처리량/지연/메모리를 측정하고
+기준선(JSON)과 비교해 설정한 임계값 이상 느려지면 실패 (오프라인, 네트워크 불필요)
+
+사용법:
+    python scripts/benchmark-image-pipeline.py --save-baseline scripts/benchmark_baseline.json
+    python scripts/benchmark-image-pipeline.py --baseline scripts/benchmark_baseline.json --threshold 0.2
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import PIL
+from PIL import Image
+
+from image_common import load_script_module
+
+# 합성 입력: 이름 -> (포맷, 크기, 모드)
+BENCHMARK_CASES = {
+    "jpeg-large-landscape": ("JPEG", (4000, 3000), "RGB"),
+    "jpeg-large-portrait": ("JPEG", (2000, 3000), "RGB"),
+    "jpeg-small-landscape": ("JPEG", (640, 480), "RGB"),
+    "png-alpha-large-portrait": ("PNG", (1200, 1600), "RGBA"),
+    "png-alpha-small-landscape": ("PNG", (500, 300), "RGBA"),
+}
+
+# optimize_image로 측정할 프리셋 (핫딜/소셜 경로)
+OPTIMIZER_PRESETS = ["hotdeal-thumb", "hotdeal-detail", "og-image"]
+
+# 측정 대상 (실행 순서)
+TARGETS = ["process_image", "optimize_image", "resize_image", "process_images_for_sizes"]
+
+DEFAULT_ITERATIONS = 3
+# 기준선 대비 허용 비율 (0.2 = 처리량 20% 감소 / 지연·메모리 20% 증가까지 허용)
+DEFAULT_THRESHOLD = 0.2
+
+def create_synthetic_image(size, mode):
+    """결정적인 합성 이미지 - 그라디언트 + 만델브로트 텍스처 (+ 방사형 알파)"""
+    red = Image.linear_gradient('L').resize(size)
+    green = Image.effect_mandelbrot(size, (-2.0, -1.5, 1.0, 1.5), 100)
+    blue = Image.radial_gradient('L').resize(size).transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+    img = Image.merge('RGB', (red, green, blue))
+    if mode == 'RGBA':
+        alpha = Image.radial_gradient('L').resize(size).point(lambda value: 255 - value)
+        img.putalpha(alpha)
+    return img
+
+def create_inputs(input_dir):
+    """케이스별 합성 입력 파일 생성 - {케이스: 경로}"""
+    input_dir.mkdir(parents=True, exist_ok=True)
+    inputs = {}
+    for name, (fmt, size, mode) in BENCHMARK_CASES.items():
+        path = input_dir / f"{name}.{'jpg' if fmt == 'JPEG' else 'png'}"
+        img = create_synthetic_image(size, mode)
+        if fmt == 'JPEG':
+            img.save(path, 'JPEG', quality=92)
+        else:
+            img.save(path, 'PNG')
+        inputs[name] = path
+    return inputs
+
+def percentile(samples, fraction):
+    """최근접 순위 백분위수"""
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+def get_peak_rss_mb():
+    """현재 프로세스의 최대 RSS (MB) - Linux는 KB, macOS는 바이트 단위"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def build_runners(target, work_dir):
+    """측정 대상별 [(변형 이름, 함수(입력 경로, 출력 접두어)), ...]"""
+    if target == "process_image":
+        module = load_script_module("hotdeal-image-processor")
+        processor = module.HotDealImageProcessor(work_dir / "manifest.sqlite3")
+
+        def run_process_image(input_path, prefix):
+            # 매번 전체 사이즈를 다시 만들도록 기록 제거 + 반복마다 새 저장소(CAS) 디렉토리
+            # (이전 반복의 결과를 재사용하면 리사이즈/인코딩 대신 해시/링크만 측정됨)
+            if str(input_path) in processor.processed_images:
+                del processor.processed_images[str(input_path)]
+            module.CAS_DIR = work_dir / "cas" / prefix
+            processor.process_image(input_path, prefix)
+        return [("all-sizes", run_process_image)]
+
+    if target == "optimize_image":
+        module = load_script_module("image-optimizer")
+        runners = []
+        for preset_name in OPTIMIZER_PRESETS:
+            preset = module.IMAGE_PRESETS[preset_name]
+            runners.append((preset_name, lambda input_path, prefix, preset=preset, name=preset_name:
+                            module.optimize_image(input_path, work_dir / f"{prefix}_{name}.jpg", preset)))
+        return runners
+
+    if target == "resize_image":
+        module = load_script_module("image-resizer")
+        return [("400x300", lambda input_path, prefix:
+                 module.resize_image(input_path, work_dir / f"{prefix}_thumb.jpg"))]
+
+    if target == "process_images_for_sizes":
+        module = load_script_module("download-hotdeal-images")
+        downloader = module.HotDealImageDownloader()
+        category_dir = work_dir / "products"
+        category_dir.mkdir(parents=True, exist_ok=True)
+
+        # process_images_for_sizes가 원본 파일마다 실행하는 크기 변환 단계
+        def run_render_sizes(input_path, prefix):
+            with Image.open(input_path) as img:
+                downloader.render_sizes(img, category_dir, prefix, dict(module.PRODUCT_IMAGE_SIZES))
+        return [("all-sizes", run_render_sizes)]
+
+    raise ValueError(f"알 수 없는 측정 대상: {target}")
+
+def run_target(target, inputs, work_dir, iterations):
+    """
+    측정 대상 하나 실행 (별도 프로세스에서 호출되어 최대 RSS가 대상별로 분리됨)
+    케이스별로 한 번 워밍업 후 iterations회 측정
+    """
+    work_dir = Path(work_dir)
+    os.chdir(work_dir)
+    with contextlib.redirect_stdout(io.StringIO()):
+        runners = build_runners(target, work_dir)
+
+    samples = {variant: [] for variant, _ in runners}
+    images = 0
+    total = 0.0
+    for case, input_path in inputs.items():
+        for iteration in range(iterations + 1):
+            for variant, runner in runners:
+                prefix = f"{case}_{iteration}"
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    runner(Path(input_path), prefix)
+                elapsed = time.perf_counter() - start
+                if iteration == 0:
+                    continue
+                samples[variant].append(elapsed * 1000)
+                total += elapsed
+            if iteration > 0:
+                images += 1
+
+    return {
+        "images": images,
+        "seconds": round(total, 4),
+        "images_per_sec": round(images / total, 3) if total else 0.0,
+        "peak_rss_mb": round(get_peak_rss_mb(), 1),
+        "variants": {
+            variant: {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 0.50), 2),
+                "p95_ms": round(percentile(values, 0.95), 2),
+                "p99_ms": round(percentile(values, 0.99), 2),
+            }
+            for variant, values in samples.items() if values
+        },
+    }
+
+def run_benchmark(targets, iterations):
+    """전체 벤치마크 실행 - 대상마다 새 프로세스에서 측정"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        inputs = {name: str(path) for name, path in create_inputs(tmp_dir / "inputs").items()}
+
+        for target in targets:
+            target_dir = tmp_dir / target
+            target_dir.mkdir()
+            print(f"⏱️  측정 중: {target}")
+            try:
+                with ProcessPoolExecutor(max_workers=1) as executor:
+                    results[target] = executor.submit(
+                        run_target, target, inputs, str(target_dir), iterations
+                    ).result()
+            except ImportError as e:
+                # 다운로더는 requests가 필요 - 설치되지 않은 환경에서는 건너뜀
+                print(f"⚠️  {target} 건너뜀 - {e}")
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+        },
+        "iterations": iterations,
+        "cases": list(BENCHMARK_CASES),
+        "results": results,
+    }
+
+def compare_with_baseline(report, baseline, threshold):
+    """기준선 대비 회귀 목록 - 처리량 감소, p95 지연/최대 RSS 증가가 threshold를 넘으면 회귀"""
+    regressions = []
+    for target, current in report["results"].items():
+        previous = baseline.get("results", {}).get(target)
+        if previous is None:
+            continue
+
+        if current["images_per_sec"] < previous["images_per_sec"] * (1 - threshold):
+            regressions.append(f"{target}: 처리량 {previous['images_per_sec']} → {current['images_per_sec']}개/s")
+        if current["peak_rss_mb"] > previous["peak_rss_mb"] * (1 + threshold):
+            regressions.append(f"{target}: 최대 RSS {previous['peak_rss_mb']} → {current['peak_rss_mb']}MB")
+
+        for variant, stats in current["variants"].items():
+            previous_stats = previous.get("variants", {}).get(variant)
+            if previous_stats and stats["p95_ms"] > previous_stats["p95_ms"] * (1 + threshold):
+                regressions.append(
+                    f"{target}/{variant}: p95 {previous_stats['p95_ms']} → {stats['p95_ms']}ms"
+                )
+    return regressions
+
+def print_report(report):
+    """결과 표 출력"""
+    env = report["environment"]
+    print(f"\n📊 이미지 파이프라인 벤치마크 (Python {env['python']}, Pillow {env['pillow']}, "
+          f"입력 {len(report['cases'])}종 x {report['iterations']}회)")
+    for target, result in report["results"].items():
+        print(f"\n{target}: {result['images_per_sec']}개/s, 최대 RSS {result['peak_rss_mb']}MB")
+        for variant, stats in result["variants"].items():
+            print(f"  {variant:16} p50 {stats['p50_ms']:8.2f}ms  p95 {stats['p95_ms']:8.2f}ms  "
+                  f"p99 {stats['p99_ms']:8.2f}ms  ({stats['count']}회)")
+
+def main():
+    parser = argparse.ArgumentParser(description="HiKo 이미지 파이프라인 벤치마크")
+    parser.add_argument("--targets", nargs="+", choices=TARGETS, default=TARGETS, help="측정 대상 (기본: 전체)")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS, help="입력별 측정 횟수")
+    parser.add_argument("--baseline", help="비교할 기준선 JSON 경로")
+    parser.add_argument("--save-baseline", help="결과를 기준선 JSON으로 저장할 경로")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="허용 회귀 비율 (기본 0.2 = 20%%)")
+    parser.add_argument("--json", help="결과 보고서 JSON 경로")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.targets, args.iterations)
+    print_report(report)
+
+    for path in (args.json, args.save_baseline):
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"\n✓ 저장: {path}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n✗ 기준선 대비 {args.threshold:.0%} 이상 회귀:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+        print(f"\n✅ 기준선 대비 회귀 없음 (임계값 {args.threshold:.0%})")
+
+if __name__ == "__main__":
+    main()
@@ -5,17 +5,44 @@ Google 이미지 검색 결과에서 고품질 핫딜 이미지를 다운로드
 """
 
 import os
+import io
 import json
-import requests
-from pathlib import Path
+import queue
+import argparse
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from urllib.parse import urlparse
 
+from download_engine import (
+    ConcurrentDownloader, DownloadCache, DOWNLOADED, NOT_MODIFIED,
+    DEFAULT_HOST_RATE, DEFAULT_MAX_BYTES, DEFAULT_WORKERS
+)
+
+# 상품 이미지 크기
+PRODUCT_IMAGE_SIZES = {
+    "thumb": (400, 300),
+    "detail": (800, 600),
+    "og": (1200, 630)
+}
+
+# 파이프라인 모드: 다운로드와 디코드/리사이즈 사이의 대기열 크기 (메모리 상한)
+PIPELINE_QUEUE_SIZE = 32
+
 class HotDealImageDownloader:
-    def __init__(self):
+    def __init__(self, workers=DEFAULT_WORKERS, host_rate=DEFAULT_HOST_RATE, max_bytes=DEFAULT_MAX_BYTES):
         self.output_dir = Path("public/images/products")
         self.output_dir.mkdir(parents=True, exist_ok=True)
         
+        # URL별 ETag/Last-Modified/내용 해시 (조건부 재검증용)
+        self.cache = DownloadCache(self.output_dir / "download_cache.json")
+        # 커넥션 풀 + 호스트별 속도 제한 동시 다운로더 (크기 제한/이미지 검사 포함)
+        self.engine = ConcurrentDownloader(max_workers=workers, host_rate=host_rate,
+                                           max_bytes=max_bytes, cache=self.cache)
+        # 이번 실행에서 내용이 바뀐 원본 (크기 변환 재생성 대상)
+        self.changed_originals = set()
+        
         # 카테고리별 검색 키워드
         self.search_keywords = {
             "electronics": [
@@ -97,24 +124,19 @@ class HotDealImageDownloader:
     def download_image(self, url, output_path):
         """이미지 다운로드"""
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
-            
-            with open(output_path, 'wb') as f:
-                f.write(response.content)
-            
-            return True
+            return self.engine.download(url, output_path)
         except Exception as e:
             print(f"✗ 다운로드 실패: {url} - {str(e)}")
             return False
     
-    def download_category_images(self):
-        """카테고리별 이미지 다운로드"""
+    def download_category_images(self, refresh=False):
+        """
+        카테고리별 이미지 다운로드 (동시 다운로드, 호스트별 속도 제한)
+        refresh이면 기존 파일도 조건부 요청으로 재검증 (304면 전송/재처리 생략)
+        """
         print("📥 고품질 제품 이미지 다운로드 시작...")
         
+        jobs = []
         for category, urls in self.image_urls.items():
             category_dir = self.output_dir / category
             category_dir.mkdir(exist_ok=True)
@@ -123,14 +145,58 @@ class HotDealImageDownloader:
                 filename = f"{category}_{i+1}_original.jpg"
                 output_path = category_dir / filename
                 
-                if output_path.exists():
+                if output_path.exists() and not refresh:
                     print(f"⏭️  이미 존재: {filename}")
                     continue
                 
-                print(f"📥 다운로드 중: {filename}")
-                if self.download_image(url, output_path):
-                    print(f"✓ 다운로드 완료: {filename}")
-                    time.sleep(0.5)  # 서버 부하 방지
+                jobs.append((url, output_path))
+        
+        print(f"📥 {len(jobs)}개 다운로드 중...")
+        for url, output_path, status, error in self.engine.download_many(jobs):
+            if error:
+                print(f"✗ 다운로드 실패: {url} - {str(error)}")
+            elif status == DOWNLOADED:
+                self.changed_originals.add(output_path)
+                print(f"✓ 다운로드 완료: {output_path.name}")
+            elif status == NOT_MODIFIED:
+                print(f"⏭️  변경 없음 (304): {output_path.name}")
+            else:
+                print(f"⏭️  변경 없음 (동일 내용): {output_path.name}")
+        
+        self.cache.save()
+    
+    def get_pending_sizes(self, category_dir, base_name, changed=False):
+        """생성해야 할 크기 목록 - 원본이 바뀌지 않았으면 이미 있는 크기는 제외"""
+        return {
+            size_name: size for size_name, size in PRODUCT_IMAGE_SIZES.items()
+            if changed or not (category_dir / f"{base_name}_{size_name}.jpg").exists()
+        }
+    
+    def render_sizes(self, img, category_dir, base_name, pending):
+        """열린 원본 이미지로 크기별 이미지 생성"""
+        from PIL import Image
+        from image_common import decode_reduced, flatten_to_rgb, get_fit_size, plan_crop_box
+        
+        # 가장 큰 썸네일 박스(2배)를 덮는 크기로 축소 디코드
+        img = decode_reduced(img, [(width * 2, height * 2) for width, height in pending.values()])
+        img = flatten_to_rgb(img)
+        
+        for size_name, (width, height) in pending.items():
+            output_name = f"{base_name}_{size_name}.jpg"
+            output_path = category_dir / output_name
+            
+            # 2배 박스 안에 맞춘 배율에서 중앙 크롭 영역만 리샘플링
+            scaled_size = get_fit_size(img.size, (width * 2, height * 2))
+            if scaled_size[0] < width or scaled_size[1] < height:
+                # 이미지가 목표 크기보다 작은 경우 (기존과 같이 전체를 목표 크기로 늘림)
+                box = None
+            else:
+                box = plan_crop_box(img.size, (width, height), scaled_size)
+            img_copy = img.resize((width, height), Image.Resampling.LANCZOS, box=box)
+            
+            # 저장
+            img_copy.save(output_path, 'JPEG', quality=90, optimize=True)
+            print(f"✓ 생성: {output_name}")
     
     def process_images_for_sizes(self):
         """다운로드한 이미지를 다양한 크기로 처리"""
@@ -138,51 +204,106 @@ class HotDealImageDownloader:
         
         print("\n🔄 이미지 크기 변환 중...")
         
-        sizes = {
-            "thumb": (400, 300),
-            "detail": (800, 600),
-            "og": (1200, 630)
-        }
-        
         for category_dir in self.output_dir.iterdir():
             if not category_dir.is_dir():
                 continue
             
             for img_file in category_dir.glob("*_original.jpg"):
+                base_name = img_file.stem.replace("_original", "")
+                
+                # 원본이 바뀌지 않았으면 이미 있는 크기는 건너뜀 (모두 있으면 디코드도 생략)
+                pending = self.get_pending_sizes(category_dir, base_name, img_file in self.changed_originals)
+                if not pending:
+                    continue
+                
                 try:
                     with Image.open(img_file) as img:
-                        base_name = img_file.stem.replace("_original", "")
-                        
-                        for size_name, (width, height) in sizes.items():
-                            output_name = f"{base_name}_{size_name}.jpg"
-                            output_path = category_dir / output_name
-                            
-                            if output_path.exists():
-                                continue
-                            
-                            # 리사이즈 및 크롭
-                            img_copy = img.copy()
-                            img_copy.thumbnail((width * 2, height * 2), Image.Resampling.LANCZOS)
-                            
-                            # 중앙 크롭
-                            left = (img_copy.width - width) // 2
-                            top = (img_copy.height - height) // 2
-                            right = left + width
-                            bottom = top + height
-                            
-                            if left < 0 or top < 0:
-                                # 이미지가 목표 크기보다 작은 경우
-                                img_copy = img_copy.resize((width, height), Image.Resampling.LANCZOS)
-                            else:
-                                img_copy = img_copy.crop((left, top, right, bottom))
-                            
-                            # 저장
-                            img_copy.save(output_path, 'JPEG', quality=90, optimize=True)
-                            print(f"✓ 생성: {output_name}")
-                            
+                        self.render_sizes(img, category_dir, base_name, pending)
                 except Exception as e:
                     print(f"✗ 처리 실패: {img_file.name} - {str(e)}")
     
+    def run_pipeline(self, keep_originals=False, decode_workers=None):
+        """
+        다운로드 → 디코드 → 리사이즈 스트리밍 파이프라인
+        받은 바이트를 디스크를 거치지 않고 바로 디코드하며, 대기열 크기로 메모리를 제한하고
+        네트워크와 CPU 작업을 겹쳐서 실행. 원본은 keep_originals일 때만 저장
+        """
+        from PIL import Image
+        
+        decode_workers = decode_workers or os.cpu_count() or 4
+        print(f"🚀 파이프라인 모드 (다운로드 {self.engine.max_workers}, 변환 {decode_workers} 스레드)")
+        
+        jobs = []
+        for category, urls in self.image_urls.items():
+            category_dir = self.output_dir / category
+            category_dir.mkdir(exist_ok=True)
+            
+            for i, url in enumerate(urls):
+                base_name = f"{category}_{i+1}"
+                pending = self.get_pending_sizes(category_dir, base_name)
+                if not pending:
+                    print(f"⏭️  이미 존재: {base_name}")
+                    continue
+                jobs.append((url, category_dir, base_name, pending))
+        
+        fetched = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        stats = {"downloaded": 0, "processed": 0, "errors": 0}
+        stats_lock = threading.Lock()
+        
+        def count(key):
+            with stats_lock:
+                stats[key] += 1
+        
+        def fetch(job):
+            url, category_dir, base_name, pending = job
+            try:
+                data = self.engine.fetch(url)
+            except Exception as e:
+                print(f"✗ 다운로드 실패: {url} - {str(e)}")
+                count("errors")
+                return
+            count("downloaded")
+            # 대기열이 가득 차면 변환 스레드가 따라올 때까지 대기 (백프레셔)
+            fetched.put((category_dir, base_name, pending, data))
+        
+        def convert():
+            while True:
+                item = fetched.get()
+                if item is None:
+                    return
+                category_dir, base_name, pending, data = item
+                try:
+                    if keep_originals:
+                        original_path = category_dir / f"{base_name}_original.jpg"
+                        temp_path = original_path.with_name(f".{original_path.name}.part")
+                        with open(temp_path, 'wb') as f:
+                            f.write(data)
+                        os.replace(temp_path, original_path)
+                    
+                    with Image.open(io.BytesIO(data)) as img:
+                        self.render_sizes(img, category_dir, base_name, pending)
+                    count("processed")
+                except Exception as e:
+                    print(f"✗ 처리 실패: {base_name} - {str(e)}")
+                    count("errors")
+        
+        start = time.perf_counter()
+        converters = [threading.Thread(target=convert, daemon=True) for _ in range(decode_workers)]
+        for thread in converters:
+            thread.start()
+        
+        with ThreadPoolExecutor(max_workers=self.engine.max_workers) as executor:
+            list(executor.map(fetch, jobs))
+        
+        for _ in converters:
+            fetched.put(None)
+        for thread in converters:
+            thread.join()
+        
+        elapsed = time.perf_counter() - start
+        print(f"\n📊 파이프라인: 다운로드 {stats['downloaded']}개, 변환 {stats['processed']}개, "
+              f"에러 {stats['errors']}개 ({elapsed:.1f}s)")
+    
     def update_mock_data(self):
         """Mock 데이터 업데이트"""
         mock_data_path = Path("lib/db/hotdeal-mock-data.json")
@@ -216,13 +337,27 @@ class HotDealImageDownloader:
         print("✓ Mock 데이터 업데이트 완료")
 
 def main():
-    downloader = HotDealImageDownloader()
+    parser = argparse.ArgumentParser(description="HiKo 핫딜 이미지 다운로더")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="동시 다운로드 수")
+    parser.add_argument("--rate", type=float, default=DEFAULT_HOST_RATE, help="호스트별 초당 요청 수")
+    parser.add_argument("--refresh", action="store_true", help="기존 이미지도 ETag/Last-Modified로 재검증")
+    parser.add_argument("--pipeline", action="store_true", help="다운로드와 크기 변환을 디스크 왕복 없이 동시에 실행")
+    parser.add_argument("--keep-originals", action="store_true", help="파이프라인 모드에서 원본도 저장")
+    parser.add_argument("--max-mb", type=float, default=DEFAULT_MAX_BYTES / 1024 / 1024, help="이미지당 최대 다운로드 크기 (MB)")
+    args = parser.parse_args()
     
-    # 1. 고품질 이미지 다운로드
-    downloader.download_category_images()
+    downloader = HotDealImageDownloader(workers=args.workers, host_rate=args.rate,
+                                        max_bytes=int(args.max_mb * 1024 * 1024))
     
-    # 2. 다양한 크기로 변환
-    downloader.process_images_for_sizes()
+    if args.pipeline:
+        # 1+2. 다운로드와 크기 변환을 스트리밍으로 동시에 실행
+        downloader.run_pipeline(keep_originals=args.keep_originals)
+    else:
+        # 1. 고품질 이미지 다운로드
+        downloader.download_category_images(refresh=args.refresh)
+        
+        # 2. 다양한 크기로 변환
+        downloader.process_images_for_sizes()
     
     # 3. Mock 데이터 업데이트
     downloader.update_mock_data()
@@ -6,12 +6,15 @@ Unsplash API를 사용하여 고품질 샘플 이미지를 다운로드합니다
 
 import os
 import json
-import requests
+import argparse
 from pathlib import Path
-import time
+
+from download_engine import ConcurrentDownloader, DEFAULT_HOST_RATE, DEFAULT_MAX_BYTES, DEFAULT_WORKERS
 
 class SampleImageDownloader:
-    def __init__(self):
+    def __init__(self, workers=DEFAULT_WORKERS, host_rate=DEFAULT_HOST_RATE, max_bytes=DEFAULT_MAX_BYTES):
+        # 커넥션 풀 + 호스트별 속도 제한 동시 다운로더 (크기 제한/이미지 검사 포함)
+        self.engine = ConcurrentDownloader(max_workers=workers, host_rate=host_rate, max_bytes=max_bytes)
         self.output_dir = Path("public/images/samples")
         self.output_dir.mkdir(parents=True, exist_ok=True)
         
@@ -37,6 +40,7 @@ class SampleImageDownloader:
         """Picsum Photos에서 카테고리별 이미지 다운로드"""
         print("📥 Picsum Photos에서 샘플 이미지 다운로드 중...")
         
+        jobs = []
         for category, image_ids in self.picsum_ids.items():
             category_dir = self.output_dir / category
             category_dir.mkdir(exist_ok=True)
@@ -57,18 +61,14 @@ class SampleImageDownloader:
                         print(f"⏭️  이미 존재: {output_file.name}")
                         continue
                     
-                    try:
-                        response = requests.get(url, timeout=10)
-                        response.raise_for_status()
-                        
-                        with open(output_file, 'wb') as f:
-                            f.write(response.content)
-                        
-                        print(f"✓ 다운로드: {output_file.name}")
-                        time.sleep(0.5)  # API 제한 방지
-                        
-                    except Exception as e:
-                        print(f"✗ 에러: {output_file.name} - {str(e)}")
+                    jobs.append((url, output_file))
+        
+        # 동시 다운로드 (고정 sleep 대신 호스트별 토큰 버킷으로 API 제한 준수)
+        for url, output_file, status, error in self.engine.download_many(jobs):
+            if error:
+                print(f"✗ 에러: {output_file.name} - {str(error)}")
+            else:
+                print(f"✓ 다운로드: {output_file.name}")
     
     def update_mock_data_with_real_images(self):
         """Mock 데이터를 실제 이미지 경로로 업데이트"""
@@ -130,7 +130,14 @@ class SampleImageDownloader:
             print(f"  - {cat}: {count}개")
 
 def main():
-    downloader = SampleImageDownloader()
+    parser = argparse.ArgumentParser(description="HiKo 샘플 이미지 다운로더")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="동시 다운로드 수")
+    parser.add_argument("--rate", type=float, default=DEFAULT_HOST_RATE, help="호스트별 초당 요청 수")
+    parser.add_argument("--max-mb", type=float, default=DEFAULT_MAX_BYTES / 1024 / 1024, help="이미지당 최대 다운로드 크기 (MB)")
+    args = parser.parse_args()
+    
+    downloader = SampleImageDownloader(workers=args.workers, host_rate=args.rate,
+                                       max_bytes=int(args.max_mb * 1024 * 1024))
     
     # 1. Picsum Photos에서 이미지 다운로드
     downloader.download_picsum_images()
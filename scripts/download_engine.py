@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""
+HiKo 이미지 동시 다운로드 엔진
+커넥션 풀(keep-alive) 재사용, 호스트별 토큰 버킷 속도 제한, 지수 백오프 재시도
+응답은 청크 단위로 임시 파일에 스트리밍하고 크기 제한/매직 바이트 검사 후 원자적으로 rename
+캐시 인덱스(ETag/Last-Modified/내용 해시)가 있으면 조건부 요청으로 재검증
+
+벤치마크 (로컬 HTTP 서버 대상):
+    python scripts/download_engine.py --benchmark --urls 200 --latency 0.05
+"""
+
+import hashlib
+import io
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 기본 동시 다운로드 수
+DEFAULT_WORKERS = 8
+# 호스트별 초당 요청 수 / 순간 허용량 (고정 sleep 대신 토큰 버킷으로 제한)
+DEFAULT_HOST_RATE = 4.0
+DEFAULT_HOST_BURST = 4
+# 재시도 설정
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+MAX_BACKOFF = 10.0
+# 스트리밍 다운로드 설정
+DEFAULT_MAX_BYTES = 20 * 1024 * 1024
+STREAM_CHUNK_SIZE = 64 * 1024
+# 포맷 판별에 필요한 최소 헤더 길이
+SNIFF_BYTES = 16
+# 재시도할 HTTP 상태 코드
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+
+class TokenBucket:
+    """스레드 안전 토큰 버킷 - 초당 rate개, 최대 burst개까지 누적"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """토큰 하나를 얻을 때까지 대기"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+def sniff_image_format(head):
+    """매직 바이트로 이미지 포맷 판별 - 이미지가 아니면 None"""
+    if head.startswith(b'\xff\xd8\xff'):
+        return "jpeg"
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return "png"
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return "gif"
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return "webp"
+    if head[4:8] == b'ftyp' and head[8:12] in (b'avif', b'avis', b'heic', b'heix', b'mif1'):
+        return "avif" if head[8:12] in (b'avif', b'avis') else "heic"
+    if head[:2] == b'BM':
+        return "bmp"
+    return None
+
+# 다운로드 결과 상태
+DOWNLOADED = "downloaded"        # 새로 받았거나 내용이 바뀜
+NOT_MODIFIED = "not_modified"    # 304 - 본문 전송 없음
+UNCHANGED = "unchanged"          # 200이지만 내용 해시가 기존과 같음
+
+class DownloadCache:
+    """
+    URL별 재검증 정보 인덱스 (ETag, Last-Modified, 내용 해시)
+    JSON 파일 하나로 저장하며 스레드 안전
+    """
+
+    def __init__(self, index_path):
+        self.index_path = Path(index_path)
+        self.lock = threading.Lock()
+        self.entries = {}
+        if self.index_path.exists():
+            with open(self.index_path, 'r') as f:
+                self.entries = json.load(f)
+
+    def get(self, url):
+        with self.lock:
+            return self.entries.get(url)
+
+    def set(self, url, entry):
+        with self.lock:
+            self.entries[url] = entry
+
+    def save(self):
+        """인덱스 저장 (임시 파일에 쓴 뒤 원자적으로 교체)"""
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+        with self.lock:
+            with open(temp_path, 'w') as f:
+                json.dump(self.entries, f, indent=2)
+        os.replace(temp_path, self.index_path)
+
+class DownloadRejected(Exception):
+    """이미지가 아니거나 크기 제한을 넘은 응답 (재시도하지 않음)"""
+
+class RetryableError(Exception):
+    """재시도 가능한 HTTP 응답"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class ConcurrentDownloader:
+    """스레드 풀 기반 동시 다운로더"""
+
+    def __init__(self, max_workers=DEFAULT_WORKERS, host_rate=DEFAULT_HOST_RATE,
+                 host_burst=DEFAULT_HOST_BURST, max_retries=DEFAULT_MAX_RETRIES,
+                 backoff=DEFAULT_BACKOFF, timeout=10, headers=None,
+                 max_bytes=DEFAULT_MAX_BYTES, cache=None):
+        self.max_workers = max_workers
+        self.max_bytes = max_bytes
+        self.cache = cache
+        self.host_rate = host_rate
+        self.host_burst = host_burst
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.headers = dict(DEFAULT_HEADERS if headers is None else headers)
+
+        self._local = threading.local()
+        self._buckets = {}
+        self._buckets_lock = threading.Lock()
+
+    def _session(self):
+        """스레드별 세션 (keep-alive 커넥션 풀 재사용)"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update(self.headers)
+            self._local.session = session
+        return session
+
+    def _bucket(self, url):
+        """호스트별 토큰 버킷"""
+        host = urlparse(url).netloc
+        with self._buckets_lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(self.host_rate, self.host_burst)
+                self._buckets[host] = bucket
+            return bucket
+
+    def _request(self, url, headers=None):
+        """속도 제한 후 스트리밍 요청 1회 - 재시도 대상 응답은 RetryableError"""
+        self._bucket(url).acquire()
+        response = self._session().get(url, timeout=self.timeout, stream=True, headers=headers)
+
+        if response.status_code in RETRY_STATUS_CODES:
+            retry_after = response.headers.get("Retry-After")
+            response.close()
+            raise RetryableError(
+                f"HTTP {response.status_code}",
+                float(retry_after) if retry_after and retry_after.isdigit() else None
+            )
+
+        try:
+            response.raise_for_status()
+            # 선언된 크기가 제한을 넘으면 본문을 받기 전에 거부
+            declared = response.headers.get("Content-Length")
+            if declared and declared.isdigit() and int(declared) > self.max_bytes:
+                raise DownloadRejected(f"크기 제한 초과 ({int(declared)} > {self.max_bytes} bytes)")
+        except Exception:
+            response.close()
+            raise
+        return response
+
+    def _retry(self, operation):
+        """operation을 재시도/백오프와 함께 실행"""
+        attempt = 0
+        while True:
+            try:
+                return operation()
+            except (RetryableError, requests.ConnectionError, requests.Timeout,
+                    requests.exceptions.ChunkedEncodingError) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = getattr(e, "retry_after", None)
+                if delay is None:
+                    # 지수 백오프 + 지터
+                    delay = min(MAX_BACKOFF, self.backoff * (2 ** attempt)) * random.uniform(0.5, 1.0)
+                else:
+                    # 서버가 준 Retry-After도 상한 적용 (잘못된 헤더 하나로 워커가 오래 멈추지 않도록)
+                    delay = min(MAX_BACKOFF, delay)
+                time.sleep(delay)
+                attempt += 1
+
+    def _stream_body(self, response, sink, hasher=None):
+        """
+        응답 본문을 청크 단위로 sink에 기록 (hasher가 있으면 내용 해시도 계산)
+        첫 바이트로 이미지 여부를 검사하고 max_bytes를 넘으면 중단
+        반환값: (판별된 포맷, 받은 바이트 수)
+        """
+        head = b''
+        image_format = None
+        received = 0
+
+        for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+            if hasher is not None:
+                hasher.update(chunk)
+            received += len(chunk)
+            if received > self.max_bytes:
+                raise DownloadRejected(f"크기 제한 초과 (> {self.max_bytes} bytes)")
+
+            if image_format is None:
+                head += chunk
+                if len(head) < SNIFF_BYTES:
+                    continue
+                image_format = sniff_image_format(head)
+                if image_format is None:
+                    content_type = response.headers.get("Content-Type", "알 수 없음")
+                    raise DownloadRejected(f"이미지가 아님 (Content-Type: {content_type})")
+                sink.write(head)
+            else:
+                sink.write(chunk)
+
+        # 본문이 SNIFF_BYTES보다 짧은 경우
+        if image_format is None:
+            image_format = sniff_image_format(head)
+            if image_format is None:
+                raise DownloadRejected("이미지가 아님 (본문이 너무 짧음)")
+            sink.write(head)
+
+        return image_format, received
+
+    def fetch(self, url):
+        """URL 응답 본문을 메모리로 가져오기 (재시도/크기 제한/이미지 검사 포함)"""
+        def operation():
+            with self._request(url) as response:
+                buffer = io.BytesIO()
+                self._stream_body(response, buffer)
+                return buffer.getvalue()
+
+        return self._retry(operation)
+
+    def _conditional_headers(self, url, output_path):
+        """캐시 정보로 조건부 요청 헤더 구성 (출력 파일이 있을 때만)"""
+        entry = self.cache.get(url) if self.cache is not None else None
+        if entry is None or not output_path.exists():
+            return None, None
+
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return entry, headers or None
+
+    def download(self, url, output_path):
+        """
+        URL을 파일로 스트리밍 다운로드 - 임시 파일에 쓴 뒤 원자적으로 rename
+        반환값: DOWNLOADED / NOT_MODIFIED / UNCHANGED
+        """
+        output_path = Path(output_path)
+        temp_path = output_path.with_name(f".{output_path.name}.{os.getpid()}.{threading.get_ident()}.part")
+        cached, headers = self._conditional_headers(url, output_path)
+
+        def operation():
+            with self._request(url, headers) as response:
+                if response.status_code == 304:
+                    return NOT_MODIFIED, response.headers, None
+
+                hasher = hashlib.sha256()
+                try:
+                    with open(temp_path, 'wb') as f:
+                        self._stream_body(response, f, hasher)
+
+                    # 200이어도 내용이 같으면 기존 파일 유지 (후속 처리도 건너뜀)
+                    if cached and cached.get("sha256") == hasher.hexdigest() and output_path.exists():
+                        status = UNCHANGED
+                    else:
+                        os.replace(temp_path, output_path)
+                        status = DOWNLOADED
+                finally:
+                    if temp_path.exists():
+                        temp_path.unlink()
+                return status, response.headers, hasher.hexdigest()
+
+        status, response_headers, digest = self._retry(operation)
+
+        if self.cache is not None:
+            entry = dict(cached or {})
+            if digest is not None:
+                entry["sha256"] = digest
+            # 304 응답에도 갱신된 검증자가 올 수 있음
+            entry["etag"] = response_headers.get("ETag", entry.get("etag"))
+            entry["last_modified"] = response_headers.get("Last-Modified", entry.get("last_modified"))
+            entry["path"] = str(output_path)
+            entry["checked_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+            self.cache.set(url, entry)
+
+        return status
+
+    def download_many(self, jobs):
+        """
+        (url, 출력 경로) 목록을 동시에 다운로드
+        완료되는 순서대로 (url, 출력 경로, 결과 상태, 에러 또는 None) 반환
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self.download, url, output_path): (url, output_path)
+                for url, output_path in jobs
+            }
+            for future in as_completed(futures):
+                url, output_path = futures[future]
+                error = future.exception()
+                yield url, output_path, None if error else future.result(), error
+
+def run_benchmark(url_count, latency, payload_size, workers, host_rate):
+    """로컬 HTTP 서버를 상대로 순차(기존 방식) vs 동시 다운로드 비교"""
+    import tempfile
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    # JPEG 매직 바이트로 시작하는 더미 본문
+    payload = b'\xff\xd8\xff\xe0' + os.urandom(payload_size - 4)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = [f"{base_url}/image/{i}.jpg" for i in range(url_count)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+
+        # 기존 방식: 세션 없이 순차 요청 (sleep 제외)
+        start = time.perf_counter()
+        for i, url in enumerate(urls):
+            response = requests.get(url, headers=DEFAULT_HEADERS, timeout=10)
+            with open(tmp_dir / f"seq_{i}.jpg", 'wb') as f:
+                f.write(response.content)
+        sequential = time.perf_counter() - start
+
+        downloader = ConcurrentDownloader(max_workers=workers, host_rate=host_rate, host_burst=workers,
+                                          max_bytes=payload_size + 1)
+        jobs = [(url, tmp_dir / f"con_{i}.jpg") for i, url in enumerate(urls)]
+        start = time.perf_counter()
+        errors = sum(1 for _, _, _, error in downloader.download_many(jobs) if error)
+        concurrent = time.perf_counter() - start
+
+    server.shutdown()
+
+    print(f"📊 다운로드 벤치마크 ({url_count}개, 지연 {latency * 1000:.0f}ms, {payload_size // 1024}KB)")
+    print(f"  - 순차 (기존 방식, sleep 제외): {sequential:.2f}s ({url_count / sequential:.1f}개/s)")
+    print(f"  - 동시 ({workers} 워커, 호스트당 {host_rate:g}회/s): {concurrent:.2f}s ({url_count / concurrent:.1f}개/s)")
+    print(f"  - 에러: {errors}개, 속도 향상: {sequential / concurrent:.1f}배")
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="HiKo 이미지 동시 다운로드 엔진")
+    parser.add_argument("--benchmark", action="store_true", help="로컬 HTTP 서버 대상 벤치마크 실행")
+    parser.add_argument("--urls", type=int, default=200, help="벤치마크 URL 수")
+    parser.add_argument("--latency", type=float, default=0.05, help="서버 응답 지연 (초)")
+    parser.add_argument("--size", type=int, default=64 * 1024, help="응답 크기 (바이트)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="동시 다운로드 수")
+    parser.add_argument("--rate", type=float, default=1000.0, help="호스트별 초당 요청 수")
+
+    args = parser.parse_args()
+
+    if args.benchmark:
+        run_benchmark(args.urls, args.latency, args.size, args.workers, args.rate)
+    else:
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
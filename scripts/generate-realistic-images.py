@@ -6,11 +6,16 @@ HiKo 리얼한 상품 이미지 생성기
 
 import os
 import json
+import math
+import argparse
 from PIL import Image, ImageDraw, ImageFont, ImageFilter, ImageEnhance
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 import random
 import colorsys
 
+from image_common import vertical_gradient
+
 class RealisticImageGenerator:
     def __init__(self):
         self.output_dir = Path("public/images/products")
@@ -48,26 +53,51 @@ class RealisticImageGenerator:
             "home": ["리빙특가", "신상품", "베스트", "할인전", "무료배송"],
             "sports": ["아울렛", "시즌오프", "특가전", "브랜드", "기획전"]
         }
+        
+        # 정적 레이어 템플릿 캐시: (카테고리, 기본 색상) -> 배경 + 제품 영역 이미지
+        self._template_cache = {}
     
     def generate_product_image(self, category, product_name, price, discount_rate):
         """한국 쇼핑몰 스타일의 상품 이미지 생성"""
         
         # 캔버스 생성
         width, height = 800, 800
-        img = Image.new('RGB', (width, height), (255, 255, 255))
-        draw = ImageDraw.Draw(img)
         
-        # 배경 그라디언트
         colors = self.color_schemes.get(category, self.color_schemes["electronics"])
         primary_color = random.choice(colors["primary"])
         
-        # 부드러운 그라디언트 배경
-        for y in range(height):
-            factor = (y / height) ** 2  # 곡선 그라디언트
-            r = int(255 - (255 - primary_color[0]) * factor * 0.3)
-            g = int(255 - (255 - primary_color[1]) * factor * 0.3)
-            b = int(255 - (255 - primary_color[2]) * factor * 0.3)
-            draw.line([(0, y), (width, y)], fill=(r, g, b))
+        # 배경/제품 영역은 카테고리와 색상으로만 정해지므로 템플릿을 복사해서 사용
+        img = self.get_template(category, primary_color, width, height).copy()
+        draw = ImageDraw.Draw(img)
+        
+        # 상단 프로모션 배너
+        self._draw_promotion_banner(draw, category, width)
+        
+        # 할인율 뱃지
+        if discount_rate > 0:
+            self._draw_discount_badge(draw, discount_rate, width)
+        
+        # 제품명
+        self._draw_product_title(draw, product_name, width)
+        
+        # 가격 정보
+        self._draw_price_info(draw, price, discount_rate, width)
+        
+        # 하단 정보
+        self._draw_bottom_info(draw, category, width, height)
+        
+        return img
+    
+    def get_template(self, category, primary_color, width, height):
+        """정적 레이어(그라디언트 배경 + 블러 처리된 제품 영역/아이콘) 템플릿 - 처음 한 번만 렌더링"""
+        key = (category, primary_color)
+        if key in self._template_cache:
+            return self._template_cache[key]
+        
+        # 부드러운 그라디언트 배경 (곡선 그라디언트)
+        img = vertical_gradient((width, height), lambda y: tuple(
+            255 - (255 - channel) * ((y / height) ** 2) * 0.3 for channel in primary_color
+        ))
         
         # 제품 영역 (중앙의 큰 영역)
         product_area = Image.new('RGBA', (600, 400), (255, 255, 255, 240))
@@ -87,25 +117,7 @@ class RealisticImageGenerator:
         product_area = product_area.filter(ImageFilter.GaussianBlur(radius=2))
         img.paste(product_area, (100, 150), product_area)
         
-        # 상단 프로모션 배너
-        self._draw_promotion_banner(draw, category, width)
-        
-        # 할인율 뱃지
-        if discount_rate > 0:
-            self._draw_discount_badge(draw, discount_rate, width)
-        
-        # 제품명
-        self._draw_product_title(draw, product_name, width)
-        
-        # 가격 정보
-        self._draw_price_info(draw, price, discount_rate, width)
-        
-        # 하단 정보
-        self._draw_bottom_info(draw, category, width, height)
-        
-        # 장식 요소
-        self._add_decorative_elements(draw, colors["accent"], width, height)
-        
+        self._template_cache[key] = img
         return img
     
     def _draw_product_icon(self, draw, category, x, y, r):
@@ -138,7 +150,7 @@ class RealisticImageGenerator:
             draw.ellipse([x-bottle_w//2, y-bottle_h//2, 
                          x+bottle_w//2, y-20], 
                         fill=icon_color)
-            draw.rectangle([x-20, y-20, x+20, y-bottle_h//2], 
+            draw.rectangle([x-20, y-bottle_h//2, x+20, y-20], 
                           fill=icon_color)
             draw.ellipse([x-30, y-bottle_h//2-10, 
                          x+30, y-bottle_h//2+10], 
@@ -247,25 +259,26 @@ class RealisticImageGenerator:
         draw.text((width - 150, info_y), f"{stars} 4.5", 
                  fill=(255, 215, 0), font=None)
     
-    def _add_decorative_elements(self, draw, accent_colors, width, height):
-        """장식 요소 추가"""
-        # 작은 원형 장식
-        for _ in range(5):
-            x = random.randint(0, width)
-            y = random.randint(0, height)
-            size = random.randint(20, 40)
-            color = random.choice(accent_colors)
-            alpha = random.randint(20, 60)
-            
-            # 반투명 원
-            overlay = Image.new('RGBA', (size*2, size*2), (0, 0, 0, 0))
-            overlay_draw = ImageDraw.Draw(overlay)
-            overlay_draw.ellipse([0, 0, size*2, size*2], 
-                               fill=(*color, alpha))
-            overlay = overlay.filter(ImageFilter.GaussianBlur(radius=size//4))
+    def generate_and_save(self, hotdeal):
+        """핫딜 하나의 제품 이미지 생성 및 저장 - 저장 경로 반환"""
+        category = hotdeal.get("category", "other")
+        title = hotdeal.get("title", "상품명")
+        price = hotdeal.get("price", 100000)
+        discount_rate = hotdeal.get("discountRate", 0)
+        
+        # 이미지 생성
+        img = self.generate_product_image(category, title, price, discount_rate)
+        
+        # 저장
+        output_path = self.output_dir / f"{hotdeal['id']}_product.jpg"
+        img.save(output_path, 'JPEG', quality=90, optimize=True)
+        return output_path
     
-    def generate_mock_product_images(self):
-        """Mock 데이터의 제품 이미지 생성"""
+    def generate_mock_product_images(self, limit=20, workers=1):
+        """
+        Mock 데이터의 제품 이미지 생성
+        limit이 None이면 전체 카탈로그, workers가 2 이상이면 프로세스 풀로 병렬 생성
+        """
         # Mock 데이터 로드
         mock_data_path = Path("lib/db/hotdeal-mock-data.json")
         if not mock_data_path.exists():
@@ -277,27 +290,43 @@ class RealisticImageGenerator:
         
         print(f"🎨 리얼한 상품 이미지 생성 중...")
         
-        # 상위 20개 제품만 생성 (테스트)
-        for hotdeal in hotdeals[:20]:
-            category = hotdeal.get("category", "other")
-            title = hotdeal.get("title", "상품명")
-            price = hotdeal.get("price", 100000)
-            discount_rate = hotdeal.get("discountRate", 0)
-            
-            # 이미지 생성
-            img = self.generate_product_image(category, title, price, discount_rate)
-            
-            # 저장
-            output_path = self.output_dir / f"{hotdeal['id']}_product.jpg"
-            img.save(output_path, 'JPEG', quality=90, optimize=True)
-            print(f"✓ 생성: {output_path.name}")
+        # 기본은 상위 20개 제품만 생성 (테스트)
+        if limit is not None:
+            hotdeals = hotdeals[:limit]
+        
+        if workers <= 1 or len(hotdeals) <= 1:
+            for hotdeal in hotdeals:
+                output_path = self.generate_and_save(hotdeal)
+                print(f"✓ 생성: {output_path.name}")
+            return
+        
+        # 같은 카테고리끼리 묶어서 워커별 템플릿 캐시 적중률을 높임
+        hotdeals = sorted(hotdeals, key=lambda hotdeal: str(hotdeal.get("category", "other")))
+        chunksize = max(1, min(64, len(hotdeals) // (workers * 4)))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            for output_path in executor.map(_generate_in_worker, hotdeals, chunksize=chunksize):
+                print(f"✓ 생성: {output_path.name}")
 
-# math 모듈 import 추가
-import math
+# 워커 프로세스별 생성기 인스턴스 (템플릿 캐시를 워커 수명 동안 유지)
+_worker_generator = None
+
+def _init_worker():
+    """워커 프로세스 초기화"""
+    global _worker_generator
+    _worker_generator = RealisticImageGenerator()
+
+def _generate_in_worker(hotdeal):
+    """워커에서 핫딜 하나의 이미지 생성 후 저장 경로 반환"""
+    return _worker_generator.generate_and_save(hotdeal)
 
 def main():
+    parser = argparse.ArgumentParser(description="HiKo 리얼한 상품 이미지 생성")
+    parser.add_argument("--all", action="store_true", help="Mock 카탈로그 전체 생성 (기본: 상위 20개)")
+    parser.add_argument("--workers", type=int, default=1, help="병렬 생성 워커 프로세스 수")
+    args = parser.parse_args()
+    
     generator = RealisticImageGenerator()
-    generator.generate_mock_product_images()
+    generator.generate_mock_product_images(limit=None if args.all else 20, workers=args.workers)
     print("\n✅ 리얼한 상품 이미지 생성 완료!")
 
 if __name__ == "__main__":
@@ -12,159 +12,730 @@ from PIL import Image
 from pathlib import Path
 import argparse
 from datetime import datetime
+import base64
 import hashlib
+import io
+import mmap
+import queue
+import signal
+import socketserver
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import islice
+
+from image_common import (
+    MAX_DECODE_PIXELS, OUTPUT_FORMATS, ImageBudgetError, decode_reduced, flatten_to_rgb, get_adaptive_settings,
+    get_cover_size, get_output_formats, link_or_copy, plan_crop_box, prepare_decode, save_formats, vertical_gradient,
+    write_atomic
+)
+from image_ingest import iter_json_records, iter_shard, parse_shard
+from image_layout import BUNDLE_DIR_NAME, DEFAULT_LAYOUT, LAYOUTS, BundleWriter, get_variant_name, get_variant_path
+from image_manifest import ManifestStore, merge_links
+from image_memory import MemoryGovernor, read_peak_rss, reset_peak_rss
+from image_metrics import StageMetrics
+from image_phash import BKTree, dhash, dhash_file, format_hash, is_distinctive, parse_hash
 
 # 핫딜 이미지 사이즈 설정
+# formats: 출력 포맷 목록과 포맷별 품질 (없으면 quality로 JPEG만 생성)
+# adaptive: --adaptive 모드의 포맷별 바이트 예산/최소 SSIM (고정 품질 대신 이미지마다 탐색)
 HOTDEAL_IMAGE_SIZES = {
-    "thumb": {"size": (400, 300), "quality": 85, "desc": "리스트 썸네일"},
-    "thumb_mobile": {"size": (200, 150), "quality": 80, "desc": "모바일 썸네일"},
-    "detail": {"size": (800, 600), "quality": 88, "desc": "상세 페이지"},
-    "detail_mobile": {"size": (400, 300), "quality": 85, "desc": "모바일 상세"},
-    "og": {"size": (1200, 630), "quality": 90, "desc": "소셜 미디어 공유"},
+    "thumb": {"size": (400, 300), "quality": 85, "desc": "리스트 썸네일",
+              "formats": [{"format": "jpeg", "quality": 85}, {"format": "webp", "quality": 80}],
+              "adaptive": {"target_bytes": 40 * 1024}},
+    "thumb_mobile": {"size": (200, 150), "quality": 80, "desc": "모바일 썸네일",
+                     "formats": [{"format": "jpeg", "quality": 80}, {"format": "webp", "quality": 75}],
+                     "adaptive": {"target_bytes": 15 * 1024}},
+    "detail": {"size": (800, 600), "quality": 88, "desc": "상세 페이지",
+               "formats": [{"format": "jpeg", "quality": 88}, {"format": "webp", "quality": 82}],
+               "adaptive": {"target_bytes": 120 * 1024}},
+    "detail_mobile": {"size": (400, 300), "quality": 85, "desc": "모바일 상세",
+                      "formats": [{"format": "jpeg", "quality": 85}, {"format": "webp", "quality": 80}],
+                      "adaptive": {"target_bytes": 40 * 1024}},
+    # 소셜 미디어 크롤러 호환을 위해 JPEG만 생성
+    "og": {"size": (1200, 630), "quality": 90, "desc": "소셜 미디어 공유",
+           "adaptive": {"target_bytes": 200 * 1024}},
 }
 
+# 이미지 엔진 버전 - 리사이즈/인코딩 로직이 바뀌면 올려서 모든 사이즈를 재생성
+ENGINE_VERSION = 4
+
+# 캐스케이드 품질 가드: 중간 이미지가 목표 커버 크기의 이 배율 이상일 때만 파생 원본으로 사용
+CASCADE_MIN_RATIO = 2.0
+# 파생 원본 안에 크롭 영역이 들어가는지 판단할 때 허용하는 오차 (픽셀, 부동소수점 오차용)
+CASCADE_BOX_EPSILON = 1e-6
+
+# 파일 해시 설정 (구 로그 항목은 hash_algo 없이 md5로 기록됨)
+HASH_ALGORITHM = "blake2b"
+LEGACY_HASH_ALGORITHM = "md5"
+HASH_CHUNK_SIZE = 1024 * 1024
+MMAP_THRESHOLD = 4 * 1024 * 1024
+
 # 이미지 캐시 디렉토리
 CACHE_DIR = Path("public/images/hotdeals")
+# 콘텐츠 주소 저장소 - 사이즈별 결과를 (원본 해시, 설정 지문)당 한 번만 만들고 핫딜 디렉토리에 하드링크
+CAS_DIR = CACHE_DIR / "_cas"
+# CAS 파일 이름에 쓰는 원본 해시 길이 (16진수 32자 = 128비트)
+CAS_HASH_LENGTH = 32
+# 처리 기록 매니페스트 (SQLite) - 기존 JSON 로그는 최초 실행 시 자동으로 가져옴
+MANIFEST_PATH = Path("scripts/processed_images.sqlite3")
 PROCESSED_LOG = Path("scripts/processed_images.json")
+# 상주 모드에서 바이트로 받은 원본 저장 위치 (내용 해시 이름이라 같은 이미지는 한 번만 처리)
+DAEMON_SOURCE_DIR = Path("scripts/.image-daemon-sources")
+# 레코드 입력의 로컬 이미지 경로 필드 (앞쪽 우선) - "/"로 시작하면 IMAGE_ROOT 기준 (Next.js public 경로)
+RECORD_IMAGE_FIELDS = ("imagePath", "imageUrl", "image_url")
+IMAGE_ROOT = Path("public")
+# 스트리밍 입력을 병렬 처리할 때 워커당 미리 읽어 두는 작업 수 (입력 전체를 목록으로 만들지 않음)
+BATCH_WINDOW_PER_WORKER = 256
+# 상주 모드 결과 상태 - 작업 중 늘어난 통계 항목 -> 상태
+DAEMON_STATUSES = {"processed": "processed", "linked": "linked", "skipped": "skipped",
+                   "rejected": "rejected", "errors": "error"}
 
 class HotDealImageProcessor:
-    def __init__(self):
+    def __init__(self, manifest_path=MANIFEST_PATH, read_only=False, adaptive=False,
+                 max_pixels=MAX_DECODE_PIXELS, governor=None, phash_distance=None, layout=DEFAULT_LAYOUT):
+        self.manifest_path = Path(manifest_path)
+        self.read_only = read_only
+        # 핫딜별 출력 레이아웃 (flat/fanout/bundle) - bundle은 한 프로세스만 기록하므로 워커는 링크할 항목만 모아 부모에 전달
+        self.layout = layout
+        self.bundle = BundleWriter(CACHE_DIR / BUNDLE_DIR_NAME) if layout == "bundle" and not read_only else None
+        self.bundle_links = []
+        # 적응형 인코딩 모드 (사이즈 설정의 adaptive 목표에 맞춰 품질 탐색)
+        self.adaptive = adaptive
+        # 메모리 거버너: 디코드 전 픽셀 예산 확인 + (설정 시) 워커 간 공유 메모리 예산으로 작업 승인
+        self.max_pixels = max_pixels
+        self.governor = governor
+        # 유사 원본 탐지: 지각 해시(dHash) 해밍 거리가 이 값 이하인 처리된 원본의 결과를 재사용 (None이면 끔)
+        self.phash_distance = phash_distance
+        self._phash_index = None
         self.processed_images = self.load_processed_log()
-        self.stats = {
+        self.stats = self.new_stats()
+        # 단계별(해시/디코드/변환/리사이즈/인코딩/쓰기) x 사이즈별 소요 시간 히스토그램
+        self.metrics = StageMetrics()
+        # 실행 중 해시 캐시: 경로 -> (크기, mtime_ns, {알고리즘: 해시})
+        self._hash_cache = {}
+        # 마지막 process_image의 에러/거부 사유 (상주 모드 응답용, 성공 시 None)
+        self.last_error = None
+    
+    @staticmethod
+    def new_stats():
+        """빈 처리 통계 생성"""
+        return {
             "processed": 0,
             "skipped": 0,
             "errors": 0,
+            "rejected": 0,
+            "linked": 0,
+            "deduplicated": 0,
+            "near_duplicates": 0,
+            "missing_images": 0,
+            "variants": 0,
             "total_size_before": 0,
             "total_size_after": 0
         }
     
+    def merge_stats(self, other):
+        """다른 프로세서(워커)의 통계 합산"""
+        for key, value in other.items():
+            self.stats[key] = self.stats.get(key, 0) + value
+    
     def load_processed_log(self):
-        """처리된 이미지 로그 로드"""
-        if PROCESSED_LOG.exists():
-            with open(PROCESSED_LOG, 'r') as f:
-                return json.load(f)
-        return {}
+        """처리된 이미지 매니페스트 열기 (전체를 메모리에 올리지 않음)"""
+        if self.read_only:
+            return ManifestStore(self.manifest_path, read_only=True)
+        return ManifestStore(self.manifest_path, legacy_json=PROCESSED_LOG)
     
     def save_processed_log(self):
-        """처리된 이미지 로그 저장"""
-        PROCESSED_LOG.parent.mkdir(parents=True, exist_ok=True)
-        with open(PROCESSED_LOG, 'w') as f:
-            json.dump(self.processed_images, f, indent=2)
-    
-    def get_file_hash(self, filepath):
-        """파일 해시 생성"""
-        hash_md5 = hashlib.md5()
-        with open(filepath, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
+        """처리된 이미지 매니페스트 체크포인트 (처리 중에도 주기적으로 커밋됨)"""
+        if self.bundle is not None:
+            self.bundle.flush()
+        self.processed_images.checkpoint()
     
-    def should_process_image(self, filepath):
-        """이미지 처리 필요 여부 확인"""
-        file_hash = self.get_file_hash(filepath)
-        filename = str(filepath)
+    def close(self):
+        """매니페스트 커밋 후 번들 저널을 정렬 인덱스에 합치고 닫기"""
+        self.save_processed_log()
+        if self.bundle is not None:
+            self.bundle.close()
+            self.bundle = None
+    
+    def get_file_hash(self, filepath, algorithm=HASH_ALGORITHM, extra_algorithms=()):
+        """파일 해시 생성 - 실행 중 파일당 한 번만 읽음 (여러 알고리즘은 한 번에 계산)"""
+        stat = Path(filepath).stat()
+        key = str(filepath)
+        
+        cached = self._hash_cache.get(key)
+        if cached is None or cached[:2] != (stat.st_size, stat.st_mtime_ns):
+            cached = (stat.st_size, stat.st_mtime_ns, {})
+            self._hash_cache[key] = cached
+        digests = cached[2]
         
-        if filename in self.processed_images:
-            if self.processed_images[filename]["hash"] == file_hash:
-                return False
+        missing = [algo for algo in (algorithm, *extra_algorithms) if algo not in digests]
+        if missing:
+            hashers = {algo: hashlib.new(algo) for algo in missing}
+            with open(filepath, "rb") as f:
+                if stat.st_size >= MMAP_THRESHOLD:
+                    # 큰 파일은 메모리 매핑으로 복사 없이 해시
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                        for hasher in hashers.values():
+                            hasher.update(mapped)
+                else:
+                    for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                        for hasher in hashers.values():
+                            hasher.update(chunk)
+            for algo, hasher in hashers.items():
+                digests[algo] = hasher.hexdigest()
+        
+        return digests[algorithm]
+    
+    def get_variant_fingerprint(self, config):
+        """사이즈 설정 지문 - 크기/품질/포맷 등 출력에 영향을 주는 설정과 엔진 버전의 해시"""
+        settings = {key: value for key, value in config.items() if key not in ("desc", "formats", "adaptive")}
+        # 실제로 생성 가능한 포맷 기준 (AVIF 플러그인 설치 시 재생성되도록)
+        settings["formats"] = get_output_formats(config)
+        # 적응형 모드를 켜고 끄거나 목표를 바꾸면 재생성
+        settings["adaptive"] = get_adaptive_settings(config) if self.adaptive else None
+        settings["engine"] = ENGINE_VERSION
+        encoded = json.dumps(settings, sort_keys=True).encode()
+        return hashlib.sha1(encoded).hexdigest()[:16]
+    
+    def is_source_changed(self, filepath, entry):
+        """원본 변경 여부 확인 - 크기/mtime이 같으면 해시 없이 동일로 판정"""
+        stat = Path(filepath).stat()
+        if entry.get("original_size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns:
+            return False
+        
+        # stat이 다르거나 구 로그 항목이면 내용 해시로 비교 (새 기록용 해시도 같은 읽기에서 계산)
+        algorithm = entry.get("hash_algo", LEGACY_HASH_ALGORITHM)
+        file_hash = self.get_file_hash(filepath, algorithm, extra_algorithms=(HASH_ALGORITHM,))
+        if entry["hash"] == file_hash:
+            # 내용은 같음 - 다음 실행부터 stat으로 판정하도록 갱신
+            entry["original_size"] = stat.st_size
+            entry["mtime_ns"] = stat.st_mtime_ns
+            self.processed_images[str(filepath)] = entry
+            return False
         
         return True
     
-    def process_image(self, input_path, hotdeal_id):
-        """단일 이미지 처리"""
+    def get_pending_variants(self, filepath):
+        """다시 생성할 사이즈 목록 - 원본이 바뀌었으면 전체, 아니면 설정 지문이 바뀐 사이즈만"""
+        entry = self.processed_images.get(str(filepath))
+        if entry is None or self.is_source_changed(filepath, entry):
+            return list(HOTDEAL_IMAGE_SIZES)
+        
+        # 지문이 없는 구 로그 항목은 어떤 설정으로 만들었는지 알 수 없으므로 전체 재생성
+        recorded = entry.get("variants", {})
+        return [
+            size_name for size_name, config in HOTDEAL_IMAGE_SIZES.items()
+            if recorded.get(size_name) != self.get_variant_fingerprint(config)
+        ]
+    
+    def should_process_image(self, filepath):
+        """이미지 처리 필요 여부 확인"""
+        return bool(self.get_pending_variants(filepath))
+    
+    @staticmethod
+    def get_linked_sizes(entry, hotdeal_id):
+        """기록에서 핫딜에 연결된 사이즈 - linked_ids는 전체 사이즈, partial_links는 일부 사이즈만 연결된 핫딜"""
+        if hotdeal_id in entry.get("linked_ids", [entry["hotdeal_id"]] if entry.get("hotdeal_id") else []):
+            return set(HOTDEAL_IMAGE_SIZES)
+        return set(entry.get("partial_links", {}).get(hotdeal_id, []))
+    
+    @staticmethod
+    def set_linked_sizes(links, hotdeal_id, sizes):
+        """(linked_ids 집합, partial_links dict)에 핫딜의 연결된 사이즈 반영 - 전체 사이즈면 linked_ids로 이동"""
+        linked_ids, partial_links = links
+        if set(HOTDEAL_IMAGE_SIZES) <= set(sizes):
+            linked_ids.add(hotdeal_id)
+            partial_links.pop(hotdeal_id, None)
+        elif sizes:
+            partial_links[hotdeal_id] = [name for name in HOTDEAL_IMAGE_SIZES if name in sizes]
+    
+    def process_image(self, input_path, hotdeal_id, size_names=None):
+        """
+        단일 이미지 처리
+        사이즈별 결과는 콘텐츠 주소 저장소(CAS)에 한 번만 만들고, 핫딜 디렉토리에는 하드링크로 연결
+        size_names: 처리할 사이즈 목록 (기본: 전체)
+        """
         input_file = Path(input_path)
+        self.last_error = None
         
         if not input_file.exists():
-            print(f"✗ 파일을 찾을 수 없음: {input_path}")
+            self.last_error = f"파일을 찾을 수 없음: {input_path}"
+            print(f"✗ {self.last_error}")
             self.stats["errors"] += 1
             return
         
-        # 처리 필요 여부 확인
-        if not self.should_process_image(input_file):
+        # 처리 필요 여부 확인 (설정이 바뀐 사이즈만 재생성)
+        requested = list(HOTDEAL_IMAGE_SIZES) if size_names is None else \
+            [size_name for size_name in HOTDEAL_IMAGE_SIZES if size_name in size_names]
+        with self.metrics.time("hash"):
+            pending = [size_name for size_name in self.get_pending_variants(input_file) if size_name in requested]
+        
+        entry = self.processed_images.get(str(input_file)) or {}
+        linked_ids = set(entry.get("linked_ids", [entry["hotdeal_id"]] if entry.get("hotdeal_id") else []))
+        # 일부 사이즈만 요청한 작업(상주 모드 presets)으로 연결된 핫딜: 사이즈 목록
+        partial_links = {linked_id: list(sizes) for linked_id, sizes in entry.get("partial_links", {}).items()}
+        have = self.get_linked_sizes(entry, hotdeal_id)
+        # 레이아웃이 바뀌었으면 연결된 모든 핫딜을 새 레이아웃으로 다시 링크
+        relayout = entry.get("layout", DEFAULT_LAYOUT) != self.layout
+        if not pending and set(requested) <= have and not relayout:
             print(f"⏭️  이미 처리됨: {input_file.name}")
             self.stats["skipped"] += 1
             return
         
+        # 기록/CAS 키용 원본 해시 (실행 중 캐시되므로 파일은 한 번만 읽음)
+        with self.metrics.time("hash"):
+            file_hash = self.get_file_hash(input_file)
+        
+        # 결과가 들어 있는 저장소 키 - 유사 원본의 결과를 재사용한 항목은 그 원본의 해시
+        cas_hash = entry.get("cas_hash", file_hash) if entry.get("hash") == file_hash else file_hash
+        
+        if not pending:
+            # 같은 원본을 쓰는 다른 핫딜(또는 아직 연결되지 않은 사이즈) - 인코딩 없이 링크만 추가
+            targets = {linked_id: self.get_linked_sizes(entry, linked_id)
+                       for linked_id in (linked_ids | set(partial_links))} if relayout else {}
+            targets[hotdeal_id] = have | set(requested) if relayout else set(requested) - have
+            if all(self.link_variants(cas_hash, [name for name in HOTDEAL_IMAGE_SIZES if name in sizes], target)
+                   for target, sizes in targets.items()):
+                self.set_linked_sizes((linked_ids, partial_links), hotdeal_id, have | set(requested))
+                entry["linked_ids"] = sorted(linked_ids)
+                entry["partial_links"] = partial_links
+                entry["layout"] = self.layout
+                self.processed_images[str(input_file)] = entry
+                self.stats["linked"] += 1
+                print(f"🔗 링크: {input_file.name} → {hotdeal_id}")
+                return
+            # CAS 도입 전 항목 등 저장소에 결과가 없으면 요청된 사이즈를 다시 생성
+            pending = requested
+        elif cas_hash != file_hash:
+            # 유사 원본 결과를 쓰던 항목의 설정이 바뀌면 이 원본으로 전체를 다시 생성
+            pending = list(HOTDEAL_IMAGE_SIZES)
+        cas_hash = file_hash
+        
         # 원본 파일 크기
-        original_size = input_file.stat().st_size
+        stat = input_file.stat()
+        original_size = stat.st_size
         self.stats["total_size_before"] += original_size
         
-        # 출력 디렉토리 생성
-        output_dir = CACHE_DIR / hotdeal_id
-        output_dir.mkdir(parents=True, exist_ok=True)
+        # 다른 경로의 같은 원본이 이미 만든 사이즈는 저장소 결과를 재사용
+        reused = {}
+        for size_name in pending:
+            format_sizes = self.get_cas_outputs(file_hash, HOTDEAL_IMAGE_SIZES[size_name])
+            if format_sizes is not None:
+                reused[size_name] = format_sizes
+        to_render = [size_name for size_name in pending if size_name not in reused]
+        
+        # 적응형 품질 캐시 - 원본 해시가 같으면 이전에 찾은 품질을 재사용 (탐색 생략)
+        quality_cache = None
+        if self.adaptive:
+            cached = entry.get("adaptive_quality", {})
+            quality_cache = dict(cached.get("qualities", {})) if cached.get("hash") == file_hash else {}
         
         try:
-            with Image.open(input_path) as img:
-                # RGBA를 RGB로 변환
-                if img.mode in ('RGBA', 'LA'):
-                    background = Image.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'RGBA':
-                        background.paste(img, mask=img.split()[3])
-                    else:
-                        background.paste(img, mask=img.split()[1])
-                    img = background
-                elif img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                # 각 사이즈별로 이미지 생성
-                for size_name, config in HOTDEAL_IMAGE_SIZES.items():
-                    output_file = output_dir / f"{hotdeal_id}_{size_name}.jpg"
-                    self.create_resized_image(img, output_file, config)
-                    self.stats["total_size_after"] += output_file.stat().st_size
+            decoded_size = None
+            estimated_bytes = 0
+            rendered = {}
+            phash = None
+            duplicate = None
+            reset_peak_rss()
+            if to_render:
+                decode_start = time.perf_counter()
+                with Image.open(input_path) as img:
+                    # 헤더의 크기로 픽셀 예산 확인 (JPEG은 축소 디코드 크기 기준) 후 예상 작업 메모리 승인
+                    target_sizes = [HOTDEAL_IMAGE_SIZES[name]["size"] for name in to_render]
+                    estimated_bytes = prepare_decode(img, target_sizes, self.max_pixels)
+                    decoded_size = img.size
+                    admission = self.governor.admit(estimated_bytes) if self.governor else nullcontext()
+                    
+                    with admission:
+                        # 생성할 사이즈 중 가장 큰 사이즈를 덮는 크기로 축소 디코드
+                        img = decode_reduced(img, target_sizes, self.max_pixels)
+                        self.metrics.observe("decode", time.perf_counter() - decode_start)
+                        
+                        # RGBA를 RGB로 변환
+                        with self.metrics.time("convert"):
+                            img = flatten_to_rgb(img)
+                        
+                        with self.metrics.time("phash"):
+                            phash = dhash(img)
+                            duplicate = self.find_near_duplicate(phash, input_file)
+                        
+                        if duplicate is not None:
+                            # 유사 원본의 저장소 결과를 그대로 사용 (인코딩 생략)
+                            cas_hash, reused = duplicate[2], duplicate[3]
+                            pending = list(HOTDEAL_IMAGE_SIZES)
+                            self.stats["near_duplicates"] += 1
+                        else:
+                            # 각 사이즈별로 이미지 생성 (캐스케이드)
+                            rendered = self.render_variants(img, file_hash, to_render, quality_cache)
             
-            # 처리 완료 기록
-            self.processed_images[str(input_file)] = {
-                "hash": self.get_file_hash(input_file),
+            if phash is None:
+                # 디코드하지 않은 경우 (같은 내용의 결과가 저장소에 모두 있음) - 기록된 값 또는 축소 디코드로 계산
+                with self.metrics.time("phash"):
+                    phash = parse_hash(entry["phash"]) if entry.get("hash") == file_hash and "phash" in entry \
+                        else dhash_file(input_file)
+            
+            # 설정이 같아 저장소 파일을 공유하는 사이즈는 한 번만 집계 (나머지는 재사용으로 집계)
+            written = set()
+            for size_name, format_sizes in rendered.items():
+                cas_path = self.get_cas_path(file_hash, HOTDEAL_IMAGE_SIZES[size_name])
+                if cas_path in written:
+                    self.stats["deduplicated"] += 1
+                    continue
+                written.add(cas_path)
+                self.stats["variants"] += 1
+            self.stats["deduplicated"] += len(reused)
+            
+            # 처리 완료 기록 - 원본이 같으면 재생성하지 않은 사이즈의 지문/용량은 유지
+            partial = len(pending) < len(HOTDEAL_IMAGE_SIZES) and entry.get("hash") == file_hash
+            variants = entry.get("variants", {}) if partial else {}
+            variants.update({
+                name: self.get_variant_fingerprint(HOTDEAL_IMAGE_SIZES[name]) for name in pending
+            })
+            # 사이즈별 포맷 용량 (프론트엔드가 가장 작은 포맷을 선택할 수 있도록)
+            outputs = entry.get("outputs", {}) if partial else {}
+            outputs.update(reused)
+            outputs.update(rendered)
+            
+            # 처리 후 용량 - 원본 용량과 비교하도록 재사용/유지된 사이즈까지 이 원본의 전체 결과를 저장소 파일당 한 번씩 집계
+            counted = set()
+            for size_name, format_sizes in outputs.items():
+                cas_path = self.get_cas_path(cas_hash, HOTDEAL_IMAGE_SIZES[size_name])
+                if cas_path not in counted:
+                    counted.add(cas_path)
+                    self.stats["total_size_after"] += sum(format_sizes.values())
+            
+            # 핫딜 디렉토리 연결 - 바뀐 사이즈는 이 원본을 쓰는 다른 핫딜(각자 연결된 사이즈 중에서, 레이아웃이
+            # 바뀌었으면 연결된 사이즈 전체), 이 핫딜은 이미 연결된 사이즈와 요청된 사이즈 중 현재 설정으로 생성된 사이즈
+            current = [name for name, config in HOTDEAL_IMAGE_SIZES.items()
+                       if variants.get(name) == self.get_variant_fingerprint(config)]
+            for linked_id in (linked_ids | set(partial_links)) - {hotdeal_id}:
+                sizes = self.get_linked_sizes(entry, linked_id)
+                self.link_variants(cas_hash, [name for name in (current if relayout else pending) if name in sizes],
+                                   linked_id)
+            want = [name for name in current if name in have | set(requested)]
+            self.link_variants(cas_hash, want, hotdeal_id)
+            linked_ids.discard(hotdeal_id)
+            partial_links.pop(hotdeal_id, None)
+            self.set_linked_sizes((linked_ids, partial_links), hotdeal_id, want)
+            
+            record = {
+                "hash": file_hash,
+                "hash_algo": HASH_ALGORITHM,
                 "processed_at": datetime.now().isoformat(),
                 "hotdeal_id": hotdeal_id,
-                "original_size": original_size
+                "linked_ids": sorted(linked_ids),
+                "partial_links": partial_links,
+                "original_size": original_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "variants": {name: variants[name] for name in HOTDEAL_IMAGE_SIZES if name in variants},
+                "outputs": {name: outputs[name] for name in HOTDEAL_IMAGE_SIZES if name in outputs},
+                "phash": format_hash(phash),
+                "cas_hash": cas_hash,
+                "layout": self.layout,
             }
+            if duplicate is not None:
+                record["duplicate_of"] = duplicate[1]
+                record["phash_distance"] = duplicate[0]
+            if decoded_size is not None:
+                # 디코드 크기 / 예상 작업 메모리 / 처리 중 최대 RSS
+                record["memory"] = {
+                    "decoded_size": list(decoded_size),
+                    "estimated_bytes": estimated_bytes,
+                    "peak_rss_bytes": read_peak_rss()
+                }
+            if quality_cache is not None:
+                record["adaptive_quality"] = {"hash": record["hash"], "qualities": quality_cache}
+            elif "adaptive_quality" in entry:
+                record["adaptive_quality"] = entry["adaptive_quality"]
+            self.processed_images[str(input_file)] = record
+            if self._phash_index is not None and cas_hash == file_hash and is_distinctive(phash):
+                self._phash_index.add(phash, str(input_file))
             
             self.stats["processed"] += 1
-            print(f"✓ 처리 완료: {input_file.name} → {hotdeal_id}")
+            if duplicate is not None:
+                print(f"🧬 유사 원본 재사용: {input_file.name} → {hotdeal_id} "
+                      f"({Path(duplicate[1]).name}, 거리 {duplicate[0]})")
+            elif len(pending) < len(HOTDEAL_IMAGE_SIZES):
+                print(f"✓ 처리 완료: {input_file.name} → {hotdeal_id} ({', '.join(pending)})")
+            else:
+                print(f"✓ 처리 완료: {input_file.name} → {hotdeal_id}")
             
+        except (ImageBudgetError, Image.DecompressionBombError) as e:
+            self.last_error = str(e)
+            print(f"⛔ 처리 거부: {input_file.name} - {str(e)}")
+            self.stats["rejected"] += 1
         except Exception as e:
+            self.last_error = str(e)
             print(f"✗ 에러 발생: {input_file.name} - {str(e)}")
             self.stats["errors"] += 1
     
-    def create_resized_image(self, img, output_path, config):
-        """이미지 리사이즈 및 최적화"""
-        size = config["size"]
-        quality = config["quality"]
+    def get_phash_index(self):
+        """처리된 원본의 지각 해시 BK-트리 (처음 사용할 때 매니페스트에서 한 번만 구성)"""
+        if self._phash_index is None:
+            self._phash_index = BKTree()
+            for path, entry in self.processed_images.items():
+                # 다른 원본의 결과를 빌려 쓰는 항목은 제외 (항상 실제로 생성한 원본을 가리키도록)
+                if "phash" not in entry or entry.get("cas_hash", entry["hash"]) != entry["hash"]:
+                    continue
+                phash = parse_hash(entry["phash"])
+                if is_distinctive(phash):
+                    self._phash_index.add(phash, path)
+        return self._phash_index
+    
+    def find_near_duplicate(self, phash, input_file):
+        """
+        해밍 거리 phash_distance 이내에서 현재 설정의 결과가 저장소에 모두 있는 가장 가까운 원본 찾기
+        반환값: (거리, 원본 경로, 저장소 해시, {사이즈: {포맷: 바이트 수}}) 또는 None
+        """
+        if self.phash_distance is None or not is_distinctive(phash):
+            return None
+        
+        for distance, path in self.get_phash_index().search(phash, self.phash_distance):
+            if path == str(input_file):
+                continue
+            candidate = self.processed_images.get(path)
+            if candidate is None:
+                continue
+            candidate_hash = candidate.get("cas_hash", candidate["hash"])
+            outputs = {}
+            for size_name, config in HOTDEAL_IMAGE_SIZES.items():
+                format_sizes = self.get_cas_outputs(candidate_hash, config)
+                if format_sizes is None:
+                    break
+                outputs[size_name] = format_sizes
+            else:
+                return distance, path, candidate_hash, outputs
+        return None
+    
+    def get_cas_path(self, file_hash, config):
+        """콘텐츠 주소 경로 - 원본 해시 + 사이즈 설정 지문 (확장자는 포맷별로 바뀜)"""
+        fingerprint = self.get_variant_fingerprint(config)
+        return CAS_DIR / file_hash[:2] / f"{file_hash[:CAS_HASH_LENGTH]}_{fingerprint}.jpg"
+    
+    def get_cas_outputs(self, file_hash, config):
+        """저장소에 이미 있는 사이즈 결과의 {포맷: 바이트 수} - 포맷 하나라도 없으면 None"""
+        cas_path = self.get_cas_path(file_hash, config)
+        format_sizes = {}
+        for fmt, _ in get_output_formats(config):
+            try:
+                format_sizes[fmt] = cas_path.with_suffix("." + OUTPUT_FORMATS[fmt]["ext"]).stat().st_size
+            except FileNotFoundError:
+                return None
+        return format_sizes
+    
+    def link_variants(self, file_hash, size_names, hotdeal_id):
+        """
+        저장소의 사이즈별 결과를 핫딜 출력 위치에 연결 - 결과가 없으면 False
+        flat/fanout은 하드링크 (불가능하면 복사), bundle은 세그먼트에 기록 (워커는 부모가 기록하도록 모아 둠)
+        """
+        if any(self.get_cas_outputs(file_hash, HOTDEAL_IMAGE_SIZES[name]) is None for name in size_names):
+            return False
+        
+        if self.layout == "bundle" and self.bundle is None:
+            self.bundle_links.append((file_hash, list(size_names), hotdeal_id))
+            return True
         
-        # 원본 비율 계산
-        img_ratio = img.width / img.height
-        target_ratio = size[0] / size[1]
+        with self.metrics.time("link"):
+            for size_name in size_names:
+                config = HOTDEAL_IMAGE_SIZES[size_name]
+                cas_path = self.get_cas_path(file_hash, config)
+                for fmt, _ in get_output_formats(config):
+                    ext = OUTPUT_FORMATS[fmt]["ext"]
+                    if self.bundle is not None:
+                        self.bundle.put_file(get_variant_name(hotdeal_id, size_name, ext), cas_path.with_suffix("." + ext))
+                        continue
+                    output_path = get_variant_path(CACHE_DIR, self.layout, hotdeal_id, size_name, ext)
+                    output_path.parent.mkdir(parents=True, exist_ok=True)
+                    link_or_copy(cas_path.with_suffix("." + ext), output_path)
+        return True
+    
+    def process_batch(self, tasks, workers=1):
+        """
+        (이미지 경로, 핫딜 ID) 목록/이터레이터 일괄 처리 - workers가 2 이상이면 프로세스 풀 사용
+        이터레이터는 워커당 BATCH_WINDOW_PER_WORKER개씩만 읽어 처리 (스트리밍 입력의 메모리 사용량 일정)
+        """
+        tasks = iter(tasks)
+        
+        if workers <= 1:
+            for input_path, hotdeal_id in tasks:
+                self.process_image(input_path, hotdeal_id)
+            return
         
-        # 스마트 크롭
-        if img_ratio > target_ratio:
-            # 이미지가 더 넓음 - 높이 기준으로 리사이즈
-            new_height = size[1]
-            new_width = int(new_height * img_ratio)
+        window = list(islice(tasks, workers * BATCH_WINDOW_PER_WORKER))
+        if len(window) <= 1:
+            for input_path, hotdeal_id in window:
+                self.process_image(input_path, hotdeal_id)
+            return
+        
+        # 워커는 매니페스트를 읽기 전용으로 열고, 기록은 부모 프로세스만 수행
+        self.processed_images.checkpoint()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(self.manifest_path, self.adaptive, self.max_pixels,
+                                           self.governor, self.phash_distance, self.layout)) as executor:
+            while window:
+                # 워커당 여러 작업을 묶어서 전달 (IPC 오버헤드 감소)
+                chunksize = max(1, min(64, len(window) // (workers * 4)))
+                for stats, metrics, key, record, links in executor.map(_process_in_worker, window, chunksize=chunksize):
+                    self.merge_stats(stats)
+                    self.metrics.merge(metrics)
+                    # 번들 레이아웃은 워커가 모아 둔 링크를 부모가 기록
+                    for link in links:
+                        self.link_variants(*link)
+                    if record is not None:
+                        # 같은 원본을 여러 워커가 처리했으면 연결된 핫딜 목록을 합침
+                        previous = self.processed_images.get(key) or {}
+                        record["linked_ids"], record["partial_links"] = merge_links(previous, record)
+                        self.processed_images[key] = record
+                window = list(islice(tasks, workers * BATCH_WINDOW_PER_WORKER))
+    
+    def iter_record_tasks(self, records, image_root=IMAGE_ROOT):
+        """핫딜 레코드 -> (로컬 이미지 경로, 핫딜 ID) 작업 - 로컬 이미지가 없는 레코드는 건너뜀 (원격 URL은 다운로드 스크립트 담당)"""
+        image_root = Path(image_root)
+        for record in records:
+            hotdeal_id = str(record["id"])
+            image_path = None
+            for field in RECORD_IMAGE_FIELDS:
+                value = record.get(field)
+                if not value or "://" in value:
+                    continue
+                candidate = image_root / value.lstrip("/") if value.startswith("/") else Path(value)
+                if candidate.exists():
+                    image_path = candidate
+                    break
+            
+            if image_path is None:
+                print(f"⚠️  로컬 이미지 없음: {hotdeal_id}")
+                self.stats["missing_images"] += 1
+                continue
+            yield image_path, hotdeal_id
+    
+    def process_records(self, records_path, shard=None, workers=1, image_root=IMAGE_ROOT):
+        """
+        핫딜 레코드 파일(JSON 배열 / JSON lines, "-"는 stdin) 스트리밍 처리
+        shard=(i, N)이면 핫딜 ID 해시가 i번 샤드인 레코드만 처리 (머신마다 i를 달리해 전체 카탈로그 분할)
+        """
+        if shard is not None:
+            print(f"📸 레코드 스트리밍 처리: {records_path} (샤드 {shard[0]}/{shard[1]})")
         else:
-            # 이미지가 더 높음 - 너비 기준으로 리사이즈
-            new_width = size[0]
-            new_height = int(new_width / img_ratio)
-        
-        # 리사이즈
-        resized = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-        
-        # 중앙 크롭
-        left = (resized.width - size[0]) // 2
-        top = (resized.height - size[1]) // 2
-        right = left + size[0]
-        bottom = top + size[1]
-        
-        cropped = resized.crop((left, top, right, bottom))
-        
-        # 저장 (프로그레시브 JPEG)
-        cropped.save(
-            output_path, 
-            'JPEG', 
-            quality=quality, 
-            optimize=True,
-            progressive=True
+            print(f"📸 레코드 스트리밍 처리: {records_path}")
+        
+        records = iter_shard(iter_json_records(records_path), shard)
+        self.process_batch(self.iter_record_tasks(records, image_root), workers=workers)
+    
+    def render_variants(self, img, file_hash, size_names=None, quality_cache=None):
+        """
+        피라미드 방식 사이즈 생성 - 원본은 크롭 영역만 한 번 축소하고 작은 사이즈는 중간 이미지/큰 사이즈 결과에서 파생
+        결과는 콘텐츠 주소 저장소(get_cas_path)에 저장
+        quality_cache: 적응형 모드에서 선택된 품질 기록/재사용용 dict
+        """
+        if size_names is None:
+            size_names = list(HOTDEAL_IMAGE_SIZES)
+        
+        # 커버 크기가 큰 사이즈부터 처리
+        variants = sorted(
+            [(name, HOTDEAL_IMAGE_SIZES[name]) for name in size_names],
+            key=lambda item: get_cover_size(img.size, item[1]["size"]),
+            reverse=True
+        )
+        
+        # 사이즈별 원본 좌표 크롭 영역 (커버 리사이즈 + 중앙 크롭과 같은 영역) - 원본당 한 번만 계획
+        crop_boxes = {name: plan_crop_box(img.size, config["size"]) for name, config in variants}
+        union_box = (
+            min(box[0] for box in crop_boxes.values()), min(box[1] for box in crop_boxes.values()),
+            max(box[2] for box in crop_boxes.values()), max(box[3] for box in crop_boxes.values())
+        )
+        
+        # 모든 크롭 영역을 포함하는 부분만 가장 큰 커버 배율의 CASCADE_MIN_RATIO배로 한 번 축소
+        largest_w, largest_h = get_cover_size(img.size, variants[0][1]["size"])
+        intermediate_size = (
+            int((union_box[2] - union_box[0]) * largest_w / img.width * CASCADE_MIN_RATIO),
+            int((union_box[3] - union_box[1]) * largest_h / img.height * CASCADE_MIN_RATIO)
         )
+        if intermediate_size[0] < union_box[2] - union_box[0] and intermediate_size[1] < union_box[3] - union_box[1]:
+            with self.metrics.time("resize", "pyramid"):
+                levels = [(img.resize(intermediate_size, Image.Resampling.LANCZOS, box=union_box), union_box)]
+        else:
+            levels = [(img, (0, 0, img.width, img.height))]
+        
+        rendered = {}
+        written = {}
+        for size_name, config in variants:
+            # 설정이 같은 사이즈(thumb/detail_mobile)는 저장소 파일이 같으므로 한 번만 인코딩
+            output_file = self.get_cas_path(file_hash, config)
+            if output_file in written:
+                rendered[size_name] = written[output_file]
+                continue
+            
+            base, box = self.pick_cascade_level(levels, crop_boxes[size_name], config["size"])
+            
+            output_file.parent.mkdir(parents=True, exist_ok=True)
+            cropped, format_sizes = self.create_resized_image(base, output_file, config,
+                                                              size_name, quality_cache, box)
+            
+            # 결과도 (원본 좌표 영역과 함께) 더 작은 사이즈의 파생 원본 후보로 사용
+            levels.append((cropped, crop_boxes[size_name]))
+            rendered[size_name] = written[output_file] = format_sizes
+        
+        # {사이즈: {포맷: 바이트 수}}
+        return rendered
+    
+    @staticmethod
+    def pick_cascade_level(levels, crop_box, size):
+        """
+        품질 가드(CASCADE_MIN_RATIO, 원본 대비 확대되지 않음)를 만족하고 크롭 영역을 포함하는
+        가장 작은 중간 이미지 선택 (없으면 첫 이미지)
+        levels: [(이미지, 이미지가 덮는 원본 좌표 영역), ...] (큰 순서)
+        반환값: (이미지, 그 이미지 좌표의 크롭 영역)
+        """
+        chosen = None
+        for level, (x0, y0, x1, y1) in levels:
+            scale_x = level.width / (x1 - x0)
+            scale_y = level.height / (y1 - y0)
+            box = [(crop_box[0] - x0) * scale_x, (crop_box[1] - y0) * scale_y,
+                   (crop_box[2] - x0) * scale_x, (crop_box[3] - y0) * scale_y]
+            if chosen is None:
+                chosen = (level, tuple(box))
+                continue
+            # 원본보다 확대된 결과(작은 원본의 큰 사이즈)는 보간된 픽셀이므로 파생 원본으로 쓰지 않음
+            if scale_x > 1 or scale_y > 1:
+                continue
+            
+            box_w, box_h = box[2] - box[0], box[3] - box[1]
+            if box_w < size[0] * CASCADE_MIN_RATIO or box_h < size[1] * CASCADE_MIN_RATIO:
+                continue
+            # 크롭 영역이 이 이미지 안에 그대로 들어갈 때만 사용 (부동소수점 오차만 허용)
+            # 반올림으로 어긋난 영역을 경계로 맞추면 원본 기준 결과와 눈에 띄게 달라지므로 앞 단계(피라미드)를 사용
+            if (box[0] < -CASCADE_BOX_EPSILON or box[1] < -CASCADE_BOX_EPSILON
+                    or box[2] > level.width + CASCADE_BOX_EPSILON or box[3] > level.height + CASCADE_BOX_EPSILON):
+                continue
+            box = (max(box[0], 0), max(box[1], 0), min(box[2], level.width), min(box[3], level.height))
+            chosen = (level, box)
+        return chosen
+    
+    def create_resized_image(self, img, output_path, config, size_name="", quality_cache=None, box=None):
+        """
+        이미지 리사이즈 및 최적화 - 하나의 크롭 결과를 설정된 모든 포맷으로 저장
+        box: 리샘플링할 img 좌표 영역 (기본: 커버 리사이즈 + 중앙 크롭 영역, plan_crop_box)
+        적응형 모드에서는 크롭 결과를 기준으로 포맷별 품질을 탐색 (size_name은 캐시 키)
+        반환값: (크롭 결과, {포맷: 바이트 수})
+        """
+        size = config["size"]
+        
+        # 크롭 영역만 리샘플링 (잘려 나갈 픽셀은 리사이즈하지 않음)
+        if box is None:
+            box = plan_crop_box(img.size, size)
+        with self.metrics.time("resize", size_name):
+            cropped = img.resize(size, Image.Resampling.LANCZOS, box=box)
+        
+        # 저장 (JPEG은 프로그레시브, 그 외 포맷은 같은 확장자 자리에 나란히 저장)
+        format_sizes = save_formats(cropped, output_path, config, adaptive=self.adaptive,
+                                    quality_cache=quality_cache, cache_prefix=size_name,
+                                    timer=self.metrics.timer(size_name), progressive=True)
+        
+        return cropped, format_sizes
     
     def process_mock_data_images(self):
         """Mock 데이터의 이미지 URL을 실제 로컬 이미지로 처리"""
@@ -174,8 +745,8 @@ class HotDealImageProcessor:
             print("✗ Mock 데이터 파일을 찾을 수 없습니다.")
             return
         
-        with open(mock_data_path, 'r') as f:
-            hotdeals = json.load(f)
+        # 처리할 앞쪽 10개만 스트리밍으로 읽음 (테스트용)
+        hotdeals = list(islice(iter_json_records(mock_data_path), 10))
         
         print(f"📸 {len(hotdeals)}개 핫딜 이미지 처리 시작...")
         
@@ -188,7 +759,7 @@ class HotDealImageProcessor:
             self.create_sample_images(sample_images_dir)
         
         # 각 핫딜에 대해 이미지 처리
-        for i, hotdeal in enumerate(hotdeals[:10]):  # 테스트로 10개만
+        for i, hotdeal in enumerate(hotdeals):
             # 샘플 이미지 선택 (실제로는 크롤링된 이미지 경로)
             category = hotdeal.get("category", "other")
             sample_image = sample_images_dir / f"sample_{category}.jpg"
@@ -238,19 +809,12 @@ class HotDealImageProcessor:
         }
         
         for category, config in categories.items():
-            # 고품질 이미지 생성 (더 큰 크기로 시작)
-            img = Image.new('RGB', (1600, 1200), (245, 245, 245))
-            draw = ImageDraw.Draw(img)
-            
-            # 그라디언트 배경
+            # 고품질 이미지 생성 (더 큰 크기로 시작) - 부드러운 그라디언트 배경
             base_color = config["colors"][0]
-            for y in range(1200):
-                # 부드러운 그라디언트
-                factor = y / 1200
-                r = int(base_color[0] + (255 - base_color[0]) * factor * 0.7)
-                g = int(base_color[1] + (255 - base_color[1]) * factor * 0.7)
-                b = int(base_color[2] + (255 - base_color[2]) * factor * 0.7)
-                draw.line([(0, y), (1600, y)], fill=(r, g, b))
+            img = vertical_gradient((1600, 1200), lambda y: tuple(
+                channel + (255 - channel) * (y / 1200) * 0.7 for channel in base_color
+            ))
+            draw = ImageDraw.Draw(img)
             
             # 장식적 요소 추가
             # 원형 패턴
@@ -359,6 +923,16 @@ class HotDealImageProcessor:
         print(f"  - 처리됨: {self.stats['processed']}개")
         print(f"  - 건너뜀: {self.stats['skipped']}개")
         print(f"  - 에러: {self.stats['errors']}개")
+        if self.stats.get('linked') or self.stats.get('deduplicated'):
+            print(f"  - 링크만 추가 (같은 원본): {self.stats['linked']}개")
+            print(f"  - 저장소 재사용 사이즈: {self.stats['deduplicated']}개")
+        if self.stats.get('near_duplicates'):
+            print(f"  - 유사 원본 재사용: {self.stats['near_duplicates']}개")
+        if self.stats.get('rejected'):
+            print(f"  - 거부 (픽셀 예산 초과): {self.stats['rejected']}개")
+        if self.stats.get('missing_images'):
+            print(f"  - 로컬 이미지 없음 (레코드 입력): {self.stats['missing_images']}개")
+        print(f"  - 생성된 사이즈: {self.stats['variants']}개")
         
         if self.stats['total_size_before'] > 0:
             reduction = (1 - self.stats['total_size_after'] / self.stats['total_size_before']) * 100
@@ -366,28 +940,294 @@ class HotDealImageProcessor:
             print(f"  - 원본: {self.stats['total_size_before'] / 1024 / 1024:.2f}MB")
             print(f"  - 최적화: {self.stats['total_size_after'] / 1024 / 1024:.2f}MB")
             print(f"  - 절감률: {reduction:.1f}%")
+        
+        totals = self.metrics.stage_totals()
+        if totals:
+            print(f"\n⏱️  단계별 소요 시간:")
+            for stage, (count, seconds) in sorted(totals.items(), key=lambda item: -item[1][1]):
+                print(f"  - {stage}: {seconds:.2f}s ({count}회)")
+    
+    def export_metrics(self, json_path=None, prom_path=None):
+        """단계별 히스토그램과 처리 통계를 JSON 보고서 / Prometheus textfile로 내보내기"""
+        if json_path:
+            self.metrics.write_json(json_path, self.stats)
+            print(f"✓ 지표 보고서 저장: {json_path}")
+        if prom_path:
+            self.metrics.write_prometheus(prom_path, self.stats)
+            print(f"✓ Prometheus 지표 저장: {prom_path}")
+
+# 워커 프로세스별 프로세서 인스턴스 (풀 initializer에서 생성)
+_worker_processor = None
+
+def _init_worker(manifest_path, adaptive=False, max_pixels=MAX_DECODE_PIXELS, governor=None,
+                 phash_distance=None, layout=DEFAULT_LAYOUT):
+    """워커 프로세스 초기화 - 매니페스트를 읽기 전용으로 한 번만 열기 (메모리 예산은 부모와 공유)"""
+    global _worker_processor
+    _worker_processor = HotDealImageProcessor(manifest_path, read_only=True, adaptive=adaptive,
+                                              max_pixels=max_pixels, governor=governor,
+                                              phash_distance=phash_distance, layout=layout)
+
+def _process_in_worker(task):
+    """워커에서 단일 이미지 처리 후 (통계, 단계별 지표, 로그 키, 로그 항목, 번들 링크) 반환"""
+    input_path, hotdeal_id = task
+    processor = _worker_processor
+    processor.stats = processor.new_stats()
+    processor.metrics.reset()
+    processor.bundle_links = []
+    
+    processor.processed_images.overlay.clear()
+    processor.process_image(input_path, hotdeal_id)
+    
+    # 이번 작업에서 기록/갱신된 항목만 반환 (건너뛴 경우에도 stat 정보가 갱신될 수 있음)
+    key = str(Path(input_path))
+    return (processor.stats, processor.metrics.to_dict(), key, processor.processed_images.overlay.get(key),
+            processor.bundle_links)
+
+def save_job_source(data):
+    """상주 모드 작업의 원본 바이트 저장 - 내용 해시 이름 (확장자는 실제 포맷 기준)"""
+    with Image.open(io.BytesIO(data)) as img:
+        fmt = img.format
+    ext = {"JPEG": "jpg"}.get(fmt, fmt.lower())
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    path = DAEMON_SOURCE_DIR / f"{digest}.{ext}"
+    if not path.exists():
+        DAEMON_SOURCE_DIR.mkdir(parents=True, exist_ok=True)
+        write_atomic(path, data)
+    return path
+
+def run_daemon_job(processor, job):
+    """
+    상주 모드 작업 하나 처리
+    job: {"id", "hotdeal_id", "path" 또는 "data"(base64), "presets"(사이즈 목록, 생략 시 전체)}
+    반환값: {"id", "hotdeal_id", "status", "outputs": {사이즈: {포맷: 경로}}, "timings_ms", "elapsed_ms"}
+    """
+    start = time.perf_counter()
+    result = {"id": job.get("id"), "hotdeal_id": job.get("hotdeal_id")}
+    
+    presets = job.get("presets")
+    unknown = [name for name in presets or [] if name not in HOTDEAL_IMAGE_SIZES]
+    if not job.get("hotdeal_id") or ("path" in job) == ("data" in job) or unknown:
+        result["status"] = "invalid"
+        result["error"] = (f"알 수 없는 사이즈: {', '.join(unknown)}" if unknown
+                           else "hotdeal_id와 path/data 중 하나가 필요함")
+        return result
+    
+    # 작업별 단계 소요 시간은 별도로 측정 후 전체 지표에 합산
+    job_metrics = StageMetrics()
+    metrics, processor.metrics = processor.metrics, job_metrics
+    before = dict(processor.stats)
+    try:
+        if "data" in job:
+            with job_metrics.time("receive"):
+                input_path = save_job_source(base64.b64decode(job["data"]))
+        else:
+            input_path = Path(job["path"])
+        processor.process_image(input_path, job["hotdeal_id"], presets)
+        processor.save_processed_log()
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+    finally:
+        processor.metrics = metrics
+        metrics.merge(job_metrics.to_dict())
+    
+    if "status" not in result:
+        # 이번 작업에서 늘어난 통계 항목으로 결과 판정
+        changed = [status for key, status in DAEMON_STATUSES.items()
+                   if processor.stats.get(key, 0) > before.get(key, 0)]
+        result["status"] = changed[0] if changed else "skipped"
+        if processor.last_error is not None:
+            result["error"] = processor.last_error
+        if processor.stats.get("near_duplicates", 0) > before.get("near_duplicates", 0):
+            result["near_duplicate"] = True
+    
+    result["outputs"] = {}
+    for size_name in presets or HOTDEAL_IMAGE_SIZES:
+        paths = {}
+        for fmt, _ in get_output_formats(HOTDEAL_IMAGE_SIZES[size_name]):
+            ext = OUTPUT_FORMATS[fmt]['ext']
+            if processor.bundle is not None:
+                # 번들 레이아웃은 파일 대신 번들 키
+                name = get_variant_name(job["hotdeal_id"], size_name, ext)
+                if processor.bundle.lookup(name) is not None:
+                    paths[fmt] = name
+                continue
+            path = get_variant_path(CACHE_DIR, processor.layout, job["hotdeal_id"], size_name, ext)
+            if path.exists():
+                paths[fmt] = str(path)
+        if paths:
+            result["outputs"][size_name] = paths
+    result["timings_ms"] = {stage: round(seconds * 1000, 2)
+                            for stage, (_, seconds) in job_metrics.stage_totals().items()}
+    result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
+def handle_daemon_line(processor, line):
+    """JSON 한 줄 처리 - 작업 또는 {"op": "stats"}"""
+    try:
+        job = json.loads(line)
+        if not isinstance(job, dict):
+            raise ValueError("JSON 객체가 아님")
+    except ValueError as e:
+        return {"status": "invalid", "error": f"잘못된 요청: {e}"}
+    
+    if job.get("op") == "stats":
+        return {"id": job.get("id"), "status": "ok", "stats": processor.stats,
+                "stages": {stage: {"count": count, "seconds": round(seconds, 3)}
+                           for stage, (count, seconds) in processor.metrics.stage_totals().items()}}
+    return run_daemon_job(processor, job)
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    """유닉스 소켓 연결 하나 - JSON lines 요청마다 결과 한 줄 응답"""
+    
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            # 프로세서/매니페스트(SQLite)는 메인 스레드 소유 - 작업 큐로 넘기고 결과를 기다림
+            future = Future()
+            self.server.jobs.put((line, future))
+            self.wfile.write((json.dumps(future.result(), ensure_ascii=False) + "\n").encode())
+            self.wfile.flush()
+
+class DaemonServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    
+    def __init__(self, socket_path):
+        self.jobs = queue.Queue()
+        super().__init__(str(socket_path), DaemonRequestHandler)
+
+def run_daemon(processor, socket_path=None, out=None):
+    """
+    상주 모드 - 프로세서와 매니페스트를 열어 둔 채 JSON lines 작업을 받아 처리 (호출마다 인터프리터/PIL 로딩 생략)
+    socket_path가 없으면 stdin → out(기본 stdout), 있으면 유닉스 소켓 (여러 연결 가능)
+    """
+    out = out or sys.stdout
+    
+    def stop(signum, frame):
+        # 종료 정리(매니페스트 커밋) 중에 다시 받은 신호는 무시
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        if socket_path is None:
+            print("🛰️  상주 모드 대기 중 (stdin JSON lines)", file=sys.stderr)
+            for line in sys.stdin:
+                if not line.strip():
+                    continue
+                out.write(json.dumps(handle_daemon_line(processor, line), ensure_ascii=False) + "\n")
+                out.flush()
+        else:
+            socket_path = Path(socket_path)
+            if socket_path.exists():
+                socket_path.unlink()
+            with DaemonServer(socket_path) as server:
+                threading.Thread(target=server.serve_forever, daemon=True).start()
+                print(f"🛰️  상주 모드 대기 중: {socket_path}", file=sys.stderr)
+                try:
+                    # 연결은 여러 개 받되 작업은 도착 순서대로 하나씩 처리
+                    while True:
+                        line, future = server.jobs.get()
+                        future.set_result(handle_daemon_line(processor, line))
+                finally:
+                    server.shutdown()
+                    socket_path.unlink(missing_ok=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        processor.close()
+        processor.print_stats()
 
 def main():
     parser = argparse.ArgumentParser(description="HiKo 핫딜 이미지 배치 처리")
     parser.add_argument("--mock", action="store_true", help="Mock 데이터 이미지 처리")
     parser.add_argument("--input", help="입력 이미지 디렉토리")
     parser.add_argument("--clean", action="store_true", help="캐시 디렉토리 정리")
+    parser.add_argument("--records", help="핫딜 레코드 파일 스트리밍 처리 (JSON 배열 또는 JSON lines, -는 stdin)")
+    parser.add_argument("--shard", help="레코드 입력 분할 - 핫딜 ID 해시 기준 i/N번째 샤드만 처리 (예: 0/4)")
+    parser.add_argument("--image-root", default=str(IMAGE_ROOT), help="레코드의 /로 시작하는 이미지 경로 기준 디렉토리")
+    parser.add_argument("--merge-manifest", nargs="+", metavar="MANIFEST",
+                        help="샤드별 매니페스트를 --manifest로 합치기")
+    parser.add_argument("--workers", type=int, default=1, help="병렬 처리 워커 프로세스 수 (--input/--records 전용)")
+    parser.add_argument("--manifest", default=str(MANIFEST_PATH), help="처리 기록 매니페스트 경로 (SQLite)")
+    parser.add_argument("--export-log", help="매니페스트를 JSON으로 내보낼 경로")
+    parser.add_argument("--metrics-json", help="단계별 소요 시간 히스토그램 JSON 보고서 경로")
+    parser.add_argument("--metrics-prom", help="Prometheus textfile collector 지표 파일 경로 (.prom)")
+    parser.add_argument("--max-pixels", type=int, default=MAX_DECODE_PIXELS,
+                        help="디코드할 최대 픽셀 수 (JPEG은 축소 디코드 후 기준, 초과 시 거부)")
+    parser.add_argument("--memory-limit", type=int,
+                        help="워커 전체가 동시에 사용할 작업 메모리 상한 (MB)")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="적응형 인코딩 (사이즈별 바이트 예산/최소 SSIM에 맞춰 품질 탐색)")
+    parser.add_argument("--daemon", action="store_true",
+                        help="상주 모드 - stdin(또는 --socket)으로 JSON lines 작업을 받아 처리하고 결과를 한 줄씩 응답")
+    parser.add_argument("--socket", help="상주 모드 유닉스 소켓 경로 (생략 시 stdin/stdout)")
+    parser.add_argument("--layout", choices=LAYOUTS, default=DEFAULT_LAYOUT,
+                        help="핫딜별 출력 레이아웃 - flat(핫딜별 디렉토리), fanout(ID 해시 2단계 디렉토리), "
+                             "bundle(세그먼트 파일 + 오프셋 인덱스)")
+    parser.add_argument("--phash-distance", type=int,
+                        help="유사 원본 재사용 - 지각 해시(128비트) 해밍 거리가 이 값 이하이면 기존 결과를 링크 (권장 6~10)")
     
     args = parser.parse_args()
     
-    processor = HotDealImageProcessor()
+    try:
+        shard = parse_shard(args.shard) if args.shard else None
+    except ValueError as e:
+        parser.error(str(e))
     
     if args.clean:
         if CACHE_DIR.exists():
             shutil.rmtree(CACHE_DIR)
             print("✓ 캐시 디렉토리 정리 완료")
-        if PROCESSED_LOG.exists():
-            PROCESSED_LOG.unlink()
+        manifest_path = Path(args.manifest)
+        removed = False
+        for path in (PROCESSED_LOG, manifest_path,
+                     manifest_path.with_name(manifest_path.name + "-wal"),
+                     manifest_path.with_name(manifest_path.name + "-shm")):
+            if path.exists():
+                path.unlink()
+                removed = True
+        if removed:
             print("✓ 처리 로그 초기화 완료")
         return
     
-    if args.mock:
+    results_out = sys.stdout
+    if args.daemon:
+        # 상주 모드의 stdout은 결과 줄 전용 - 진행 메시지/통계는 모두 stderr로
+        sys.stdout = sys.stderr
+    
+    governor = MemoryGovernor(args.memory_limit * 1024 * 1024) if args.memory_limit else None
+    processor = HotDealImageProcessor(args.manifest, adaptive=args.adaptive,
+                                      max_pixels=args.max_pixels, governor=governor,
+                                      phash_distance=args.phash_distance, layout=args.layout)
+    
+    if args.export_log:
+        processor.processed_images.export_json(args.export_log)
+        print(f"✓ 매니페스트 내보내기 완료: {args.export_log}")
+        return
+    
+    if args.merge_manifest:
+        for other_path in args.merge_manifest:
+            try:
+                merged = processor.processed_images.merge_from(other_path)
+            except (OSError, ValueError, sqlite3.DatabaseError) as e:
+                print(f"✗ 매니페스트 합치기 실패: {e}")
+                sys.exit(1)
+            print(f"✓ 매니페스트 합치기: {other_path} ({merged}개)")
+        return
+    
+    if args.daemon:
+        run_daemon(processor, args.socket, results_out)
+        processor.export_metrics(args.metrics_json, args.metrics_prom)
+    elif args.records:
+        processor.process_records(args.records, shard, workers=args.workers, image_root=args.image_root)
+        processor.close()
+        processor.print_stats()
+        processor.export_metrics(args.metrics_json, args.metrics_prom)
+    elif args.mock:
         processor.process_mock_data_images()
+        processor.close()
+        processor.export_metrics(args.metrics_json, args.metrics_prom)
     elif args.input:
         # 디렉토리 내 모든 이미지 처리
         input_dir = Path(args.input)
@@ -402,17 +1242,24 @@ def main():
         
         print(f"📸 {len(image_files)}개 이미지 발견")
         
-        for i, img_file in enumerate(image_files):
-            # 파일명을 ID로 사용 (실제로는 핫딜 ID 매핑 필요)
-            hotdeal_id = img_file.stem
-            processor.process_image(img_file, hotdeal_id)
+        # 파일명을 ID로 사용 (실제로는 핫딜 ID 매핑 필요)
+        tasks = [(img_file, img_file.stem) for img_file in image_files]
+        processor.process_batch(tasks, workers=args.workers)
         
-        processor.save_processed_log()
+        processor.close()
         processor.print_stats()
+        processor.export_metrics(args.metrics_json, args.metrics_prom)
     else:
         print("사용법:")
         print("  Mock 데이터 처리: python hotdeal-image-processor.py --mock")
         print("  디렉토리 처리: python hotdeal-image-processor.py --input <디렉토리>")
+        print("  병렬 처리: python hotdeal-image-processor.py --input <디렉토리> --workers 8")
+        print("  레코드 분할 처리: python hotdeal-image-processor.py --records hotdeals.jsonl --shard 0/4")
+        print("  샤드 매니페스트 합치기: python hotdeal-image-processor.py --merge-manifest shard0.sqlite3 shard1.sqlite3")
+        print("  출력 레이아웃: python hotdeal-image-processor.py --input <디렉토리> --layout fanout|bundle")
+        print("  적응형 인코딩: python hotdeal-image-processor.py --input <디렉토리> --adaptive")
+        print("  단계별 지표: python hotdeal-image-processor.py --input <디렉토리> --metrics-json m.json --metrics-prom m.prom")
+        print("  상주 모드: python hotdeal-image-processor.py --daemon [--socket /tmp/hiko-images.sock]")
         print("  캐시 정리: python hotdeal-image-processor.py --clean")
 
 if __name__ == "__main__":
@@ -10,8 +10,17 @@ import json
 from PIL import Image
 from pathlib import Path
 import argparse
+import hashlib
+import time
+
+from image_common import decode_reduced, flatten_to_rgb, resize_cover, save_formats, vertical_gradient
+
+# 적응형 인코딩 품질 캐시 (출력 디렉토리별, 원본 해시 -> {프리셋:포맷:목표: 품질})
+ADAPTIVE_CACHE_NAME = "adaptive_quality.json"
 
 # 이미지 사이즈 프리셋
+# 프리셋에 "formats": [{"format": "webp", "quality": 80}, ...]를 추가하면 같은 리사이즈 결과를 여러 포맷으로 저장
+# "adaptive": {"target_bytes": ..., "min_ssim": ...}는 --adaptive 모드의 품질 탐색 목표
 IMAGE_PRESETS = {
     # 히어로 섹션
     "hero-desktop": {"size": (1920, 1080), "quality": 90, "desc": "히어로 섹션 데스크톱"},
@@ -23,8 +32,12 @@ IMAGE_PRESETS = {
     "landing-feature": {"size": (600, 400), "quality": 85, "desc": "기능 소개 이미지"},
     
     # 핫딜 카드
-    "hotdeal-thumb": {"size": (400, 300), "quality": 85, "desc": "핫딜 썸네일"},
-    "hotdeal-detail": {"size": (800, 600), "quality": 88, "desc": "핫딜 상세 이미지"},
+    "hotdeal-thumb": {"size": (400, 300), "quality": 85, "desc": "핫딜 썸네일",
+                      "formats": [{"format": "jpeg", "quality": 85}, {"format": "webp", "quality": 80}],
+                      "adaptive": {"target_bytes": 40 * 1024}},
+    "hotdeal-detail": {"size": (800, 600), "quality": 88, "desc": "핫딜 상세 이미지",
+                       "formats": [{"format": "jpeg", "quality": 88}, {"format": "webp", "quality": 82}],
+                       "adaptive": {"target_bytes": 120 * 1024}},
     
     # 카테고리 아이콘
     "category-icon": {"size": (120, 120), "quality": 90, "desc": "카테고리 아이콘"},
@@ -49,15 +62,13 @@ def create_placeholder_image(size, text, output_path):
     """
     from PIL import ImageDraw, ImageFont
     
-    # 그라디언트 배경 생성
-    img = Image.new('RGB', size, '#FF6B00')
-    draw = ImageDraw.Draw(img)
+    # 그라디언트 배경 생성 (#FF6B00 계열, // 1은 양수의 int()와 같은 소수점 버림)
+    def gradient(y):
+        color_value = (255 * (1 - y / size[1] * 0.3)) // 1
+        return (255, 107 + ((color_value - 107) * 0.3) // 1, color_value)
     
-    # 그라디언트 효과
-    for i in range(size[1]):
-        color_value = int(255 * (1 - i / size[1] * 0.3))
-        color = (255, 107 + int((color_value - 107) * 0.3), color_value)
-        draw.line([(0, i), (size[0], i)], fill=color)
+    img = vertical_gradient(size, gradient)
+    draw = ImageDraw.Draw(img)
     
     # 텍스트 추가
     try:
@@ -89,58 +100,74 @@ def create_placeholder_image(size, text, output_path):
     img.save(output_path, 'JPEG', quality=90, optimize=True)
     print(f"✓ 플레이스홀더 생성: {output_path}")
 
-def optimize_image(input_path, output_path, preset):
+def load_source(input_path, sizes):
     """
-    이미지 최적화 및 리사이즈
+    원본 이미지를 한 번 디코드하고 RGB로 정규화
+    sizes 중 가장 큰 크기를 덮는 해상도로 축소 디코드
     """
-    size = preset["size"]
-    quality = preset["quality"]
+    with Image.open(input_path) as img:
+        img = decode_reduced(img, sizes)
+        return flatten_to_rgb(img)
+
+def get_source_hash(input_path):
+    """원본 파일 해시 (적응형 품질 캐시 키)"""
+    hasher = hashlib.blake2b()
+    with open(input_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def load_quality_cache(output_dir):
+    """적응형 품질 캐시 로드"""
+    cache_file = Path(output_dir) / ADAPTIVE_CACHE_NAME
+    if cache_file.exists():
+        with open(cache_file, 'r') as f:
+            return json.load(f)
+    return {}
+
+def save_quality_cache(output_dir, cache):
+    """적응형 품질 캐시 저장"""
+    with open(Path(output_dir) / ADAPTIVE_CACHE_NAME, 'w') as f:
+        json.dump(cache, f, indent=2)
+
+def render_preset(img, output_path, preset, adaptive=False, quality_cache=None, preset_name=""):
+    """
+    디코드된 이미지로 프리셋 크기 이미지 생성
+    adaptive이면 프리셋의 "adaptive" 목표(바이트 예산/최소 SSIM)에 맞춰 품질 탐색
+    """
+    # 비율 유지하며 목표 크기를 덮도록 리사이즈 + 중앙 크롭 (크롭 영역만 리샘플링)
+    img = resize_cover(img, preset["size"])
     
+    # 저장 (설정된 모든 포맷)
+    format_sizes = save_formats(img, output_path, preset, adaptive=adaptive,
+                                quality_cache=quality_cache, cache_prefix=preset_name)
+    size_info = ", ".join(f"{fmt} {size / 1024:.1f}KB" for fmt, size in format_sizes.items())
+    print(f"✓ 최적화 완료: {output_path} ({preset['desc']}) - {size_info}")
+
+def optimize_image(input_path, output_path, preset, adaptive=False):
+    """
+    이미지 최적화 및 리사이즈
+    adaptive이면 선택된 품질을 원본 해시별로 캐시해 재실행 시 탐색 생략
+    """
     try:
-        with Image.open(input_path) as img:
-            # RGBA를 RGB로 변환
-            if img.mode in ('RGBA', 'LA'):
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'RGBA':
-                    background.paste(img, mask=img.split()[3])
-                else:
-                    background.paste(img, mask=img.split()[1])
-                img = background
-            
-            # 비율 계산
-            img_ratio = img.width / img.height
-            target_ratio = size[0] / size[1]
-            
-            if img_ratio > target_ratio:
-                # 이미지가 더 넓음 - 높이 기준으로 리사이즈
-                new_height = size[1]
-                new_width = int(new_height * img_ratio)
-            else:
-                # 이미지가 더 높음 - 너비 기준으로 리사이즈
-                new_width = size[0]
-                new_height = int(new_width / img_ratio)
-            
-            # 리사이즈
-            img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            
-            # 중앙 크롭
-            left = (img.width - size[0]) // 2
-            top = (img.height - size[1]) // 2
-            right = left + size[0]
-            bottom = top + size[1]
-            
-            img = img.crop((left, top, right, bottom))
-            
-            # 저장
-            img.save(output_path, 'JPEG', quality=quality, optimize=True)
-            print(f"✓ 최적화 완료: {output_path} ({preset['desc']})")
-            
+        img = load_source(input_path, [preset["size"]])
+        if not adaptive:
+            render_preset(img, output_path, preset)
+            return
+        
+        output_dir = Path(output_path).parent
+        cache = load_quality_cache(output_dir)
+        qualities = cache.setdefault(get_source_hash(input_path), {})
+        size_key = "{}x{}".format(*preset["size"])
+        render_preset(img, output_path, preset, True, qualities, size_key)
+        save_quality_cache(output_dir, cache)
     except Exception as e:
         print(f"✗ 에러: {input_path} - {str(e)}")
 
-def generate_image_set(input_path, output_dir, preset_names=None):
+def generate_image_set(input_path, output_dir, preset_names=None, adaptive=False):
     """
     하나의 이미지로부터 여러 버전 생성
+    원본은 한 번만 디코드/정규화하고 메모리의 이미지를 모든 프리셋에 사용
     """
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
@@ -155,19 +182,44 @@ def generate_image_set(input_path, output_dir, preset_names=None):
     input_file = Path(input_path)
     base_name = input_file.stem
     
-    # 각 프리셋별로 이미지 생성
-    for preset_name, preset in presets.items():
-        output_file = output_path / f"{base_name}_{preset_name}.jpg"
-        
-        if input_file.exists():
-            optimize_image(input_path, output_file, preset)
-        else:
-            # 플레이스홀더 생성
+    if not input_file.exists():
+        # 플레이스홀더 생성
+        for preset_name, preset in presets.items():
+            output_file = output_path / f"{base_name}_{preset_name}.jpg"
             create_placeholder_image(
                 preset["size"], 
                 preset["desc"], 
                 output_file
             )
+        return
+    
+    # 모든 프리셋을 덮는 크기로 한 번만 디코드
+    try:
+        start = time.perf_counter()
+        img = load_source(input_file, [preset["size"] for preset in presets.values()])
+        decode_time = time.perf_counter() - start
+    except Exception as e:
+        print(f"✗ 에러: {input_path} - {str(e)}")
+        return
+    
+    # 적응형 모드: 원본 해시별로 이전에 찾은 품질 재사용
+    cache = load_quality_cache(output_path) if adaptive else {}
+    qualities = cache.setdefault(get_source_hash(input_file), {}) if adaptive else None
+    
+    # 각 프리셋별로 이미지 생성
+    for preset_name, preset in presets.items():
+        output_file = output_path / f"{base_name}_{preset_name}.jpg"
+        try:
+            render_preset(img, output_file, preset, adaptive, qualities, preset_name)
+        except Exception as e:
+            print(f"✗ 에러: {output_file} - {str(e)}")
+    
+    if adaptive:
+        save_quality_cache(output_path, cache)
+    
+    # 프리셋마다 다시 디코드했다면 들었을 시간 대비 절감량
+    saved = decode_time * (len(presets) - 1)
+    print(f"⏱️  디코드 1회 {decode_time * 1000:.1f}ms - 프리셋 {len(presets)}개 기준 약 {saved * 1000:.1f}ms 절감")
 
 def generate_sample_images(output_dir):
     """
@@ -203,6 +255,8 @@ def main():
     parser.add_argument("-p", "--presets", nargs="+", help="사용할 프리셋 (기본: 전체)")
     parser.add_argument("--samples", action="store_true", help="샘플 이미지 생성")
     parser.add_argument("--list", action="store_true", help="사용 가능한 프리셋 목록")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="적응형 인코딩 (프리셋별 바이트 예산/최소 SSIM에 맞춰 품질 탐색)")
     
     args = parser.parse_args()
     
@@ -224,7 +278,7 @@ def main():
         print("프리셋 목록: python image-optimizer.py --list")
         return
     
-    generate_image_set(args.input, args.output, args.presets)
+    generate_image_set(args.input, args.output, args.presets, args.adaptive)
     print(f"\n✅ 이미지 최적화가 완료되었습니다: {args.output}")
 
 if __name__ == "__main__":
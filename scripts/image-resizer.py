@@ -9,33 +9,32 @@ import sys
 from PIL import Image
 from pathlib import Path
 
-def resize_image(input_path, output_path, size=(400, 300)):
+from image_common import decode_reduced, resize_cover, save_formats
+
+# 썸네일 출력 포맷 (같은 리사이즈 결과를 나열된 포맷으로 모두 저장)
+THUMB_FORMATS = [{"format": "jpeg", "quality": 85}]
+
+def resize_image(input_path, output_path, size=(400, 300), formats=None):
     """
     이미지를 지정된 크기로 리사이즈
     비율을 유지하면서 크롭
     """
     try:
         with Image.open(input_path) as img:
+            # 목표 크기를 덮는 크기로 축소 디코드
+            img = decode_reduced(img, [size])
+            
             # RGBA를 RGB로 변환 (JPEG 저장을 위해)
             if img.mode == 'RGBA':
                 background = Image.new('RGB', img.size, (255, 255, 255))
-                background.paste(img, mask=img.split()[3])
+                background.paste(img, mask=img)
                 img = background
             
-            # 비율 유지하면서 리사이즈
-            img.thumbnail(size, Image.Resampling.LANCZOS)
-            
-            # 정확한 크기로 크롭
-            if img.size != size:
-                # 중앙 크롭
-                left = (img.width - size[0]) / 2
-                top = (img.height - size[1]) / 2
-                right = left + size[0]
-                bottom = top + size[1]
-                img = img.crop((left, top, right, bottom))
+            # 비율 유지하며 목표 크기를 덮도록 리사이즈 + 중앙 크롭 (크롭 영역만 리샘플링)
+            img = resize_cover(img, size)
             
             # 저장
-            img.save(output_path, 'JPEG', quality=85, optimize=True)
+            save_formats(img, output_path, {"quality": 85, "formats": formats or THUMB_FORMATS})
             print(f"✓ 리사이즈 완료: {output_path}")
             
     except Exception as e:
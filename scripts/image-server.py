@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+"""
+HiKo 온디맨드 이미지 서버
+/images/<핫딜 ID>/<프리셋>.<포맷> 요청 시 원본을 찾아 바로 리사이즈 (미리 생성하지 않은 프리셋도 제공)
+메모리 LRU → 디스크 캐시 → 배치 처리 결과(CAS) → 렌더링 순으로 찾고,
+같은 변형에 대한 동시 요청은 한 번만 렌더링
+
+사용법:
+    python scripts/image-server.py --source-dir crawled_images/ --port 8081
+    curl http://127.0.0.1:8081/images/<핫딜 ID>/hotdeal-thumb.webp
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from PIL import Image
+
+from image_common import (
+    MAX_DECODE_PIXELS, OUTPUT_FORMATS, ImageBudgetError, decode_reduced, flatten_to_rgb, get_output_formats,
+    load_script_module
+)
+from image_layout import BUNDLE_DIR_NAME, BundleIndex, get_variant_name
+from image_manifest import ManifestStore
+
+processor_module = load_script_module("hotdeal-image-processor")
+optimizer_module = load_script_module("image-optimizer")
+
+# 제공 프리셋: 이미지 최적화 도구 프리셋 + 핫딜 배치 사이즈 (배치 결과가 있으면 그대로 사용)
+SERVER_PRESETS = {**optimizer_module.IMAGE_PRESETS, **processor_module.HOTDEAL_IMAGE_SIZES}
+
+# 요청 경로: /images/<핫딜 ID>/<프리셋>.<확장자>
+IMAGE_ROUTE = re.compile(r"/images/([\w-]+)/([\w-]+)\.(\w+)")
+
+# URL 확장자 -> 출력 포맷
+EXTENSION_FORMATS = {spec["ext"]: fmt for fmt, spec in OUTPUT_FORMATS.items()}
+EXTENSION_FORMATS["jpeg"] = "jpeg"
+
+CONTENT_TYPES = {"jpeg": "image/jpeg", "webp": "image/webp", "avif": "image/avif"}
+
+# 원본 디렉토리에서 찾을 확장자 (<핫딜 ID>.<확장자>)
+SOURCE_EXTENSIONS = [".jpg", ".jpeg", ".png", ".webp"]
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8081
+DISK_CACHE_DIR = Path("scripts/.image-server-cache")
+MEMORY_CACHE_MB = 64
+DISK_CACHE_MB = 1024
+DISK_CACHE_MAX_AGE_DAYS = 7
+# 원본이 바뀌어도 같은 URL이므로 짧게 캐시하고 ETag로 재검증
+CACHE_CONTROL = "public, max-age=3600"
+# 핫딜 ID -> 원본 경로 캐시 개수
+SOURCE_CACHE_SIZE = 10000
+
+class ImageNotFound(LookupError):
+    """프리셋/포맷/원본을 찾을 수 없음 (404)"""
+
+class MemoryLRU:
+    """바이트 용량 제한 LRU - 용량의 1/8보다 큰 결과는 보관하지 않음"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes // 8:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= len(previous)
+            self.entries[key] = data
+            self.total_bytes += len(data)
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.total_bytes -= len(evicted)
+
+class DiskCache:
+    """
+    용량/나이 제한 디스크 캐시 - 파일 mtime을 마지막 접근 시각으로 사용 (재시작 후에도 순서 유지)
+    용량을 넘거나 max_age초 동안 접근이 없으면 오래된 파일부터 삭제
+    """
+
+    def __init__(self, root, max_bytes, max_age):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.total_bytes = 0
+        self.evicted = 0
+        # 경로 -> (바이트 수, 마지막 접근 시각), 접근 순서
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        files = []
+        if self.root.exists():
+            for path in self.root.rglob("*"):
+                if path.is_file() and not path.name.startswith("."):
+                    stat = path.stat()
+                    files.append((stat.st_mtime, path, stat.st_size))
+        for mtime, path, size in sorted(files):
+            self.entries[path] = (size, mtime)
+            self.total_bytes += size
+        self.evict()
+
+    def path_for(self, key, ext):
+        return self.root / key[:2] / f"{key}.{ext}"
+
+    def read(self, path):
+        """캐시된 파일 내용 (없거나 만료되면 None) - 읽으면 마지막 접근 시각 갱신"""
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is None or now - entry[1] > self.max_age:
+                return None
+            self.entries[path] = (entry[0], now)
+            self.entries.move_to_end(path)
+
+        try:
+            data = path.read_bytes()
+            os.utime(path, (now, now))
+        except FileNotFoundError:
+            self._forget(path)
+            return None
+        return data
+
+    def add(self, path):
+        """새로 쓴 파일 등록 후 용량/나이 기준 정리"""
+        size = path.stat().st_size
+        with self.lock:
+            previous = self.entries.pop(path, None)
+            if previous is not None:
+                self.total_bytes -= previous[0]
+            self.entries[path] = (size, time.time())
+            self.total_bytes += size
+        self.evict()
+
+    def evict(self):
+        """접근 순서상 가장 오래된 파일부터 용량 초과분과 만료된 파일 삭제"""
+        now = time.time()
+        victims = []
+        with self.lock:
+            while self.entries:
+                path, (size, accessed) = next(iter(self.entries.items()))
+                if self.total_bytes <= self.max_bytes and now - accessed <= self.max_age:
+                    break
+                self.entries.popitem(last=False)
+                self.total_bytes -= size
+                victims.append(path)
+            self.evicted += len(victims)
+        for path in victims:
+            path.unlink(missing_ok=True)
+
+    def _forget(self, path):
+        with self.lock:
+            entry = self.entries.pop(path, None)
+            if entry is not None:
+                self.total_bytes -= entry[0]
+
+class SingleFlight:
+    """같은 키에 대한 동시 호출을 한 번만 실행하고 나머지는 그 결과(또는 예외)를 공유"""
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def do(self, key, fn):
+        """반환값: (결과, 다른 요청의 결과를 공유했는지)"""
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = self.calls[key] = Future()
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result, False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+
+class OnDemandImages:
+    """
+    온디맨드 변형 생성기 - 렌더링은 HotDealImageProcessor.create_resized_image를 그대로 사용
+    캐시 키: 원본 경로/크기/mtime + 프리셋 이름/설정 지문 (원본이나 설정이 바뀌면 새 키)
+    """
+
+    def __init__(self, source_dirs=(), manifest_path=processor_module.MANIFEST_PATH, cache_dir=DISK_CACHE_DIR,
+                 memory_bytes=MEMORY_CACHE_MB * 1024 * 1024, disk_bytes=DISK_CACHE_MB * 1024 * 1024,
+                 max_age=DISK_CACHE_MAX_AGE_DAYS * 86400, render_workers=None, max_pixels=MAX_DECODE_PIXELS,
+                 bundle_dir=None):
+        self.source_dirs = [Path(source_dir) for source_dir in source_dirs]
+        # 매니페스트는 배치 처리기가 기록 - 서버는 읽기만 하고 스레드마다 연결을 따로 엶
+        self.manifest_path = Path(manifest_path) if manifest_path and Path(manifest_path).exists() else None
+        self._local = threading.local()
+        self.processor = processor_module.HotDealImageProcessor(
+            self.manifest_path or ":memory:", read_only=True, max_pixels=max_pixels
+        )
+        # 배치 처리기의 bundle 레이아웃 출력 (있으면 저장소 파일 대신 세그먼트에서 읽음)
+        self.bundle = BundleIndex(bundle_dir) if bundle_dir and Path(bundle_dir).exists() else None
+        self.memory = MemoryLRU(memory_bytes)
+        self.disk = DiskCache(cache_dir, disk_bytes, max_age)
+        self.flight = SingleFlight()
+        # 동시 렌더링 수 제한 (리사이즈/인코딩은 GIL을 놓으므로 스레드로 병렬 처리)
+        self.render_slots = threading.BoundedSemaphore(render_workers or os.cpu_count() or 1)
+        self.sources = OrderedDict()
+        self.counters = Counter()
+        self.lock = threading.Lock()
+
+    def manifest(self):
+        if self.manifest_path is None:
+            return None
+        if not hasattr(self._local, "manifest"):
+            self._local.manifest = ManifestStore(self.manifest_path, read_only=True)
+        return self._local.manifest
+
+    def resolve_source(self, hotdeal_id):
+        """핫딜 ID의 원본 파일 - 원본 디렉토리의 <핫딜 ID>.<확장자> 우선, 없으면 매니페스트"""
+        with self.lock:
+            cached = self.sources.get(hotdeal_id)
+        if cached is not None and cached.exists():
+            return cached
+
+        source = None
+        for source_dir in self.source_dirs:
+            for ext in SOURCE_EXTENSIONS:
+                candidate = source_dir / f"{hotdeal_id}{ext}"
+                if candidate.exists():
+                    source = candidate
+                    break
+            if source is not None:
+                break
+        if source is None and self.manifest() is not None:
+            path = self.manifest().find_by_hotdeal_id(hotdeal_id)
+            if path is not None and Path(path).exists():
+                source = Path(path)
+        if source is None:
+            raise ImageNotFound(f"원본 이미지를 찾을 수 없음: {hotdeal_id}")
+
+        with self.lock:
+            self.sources[hotdeal_id] = source
+            self.sources.move_to_end(hotdeal_id)
+            while len(self.sources) > SOURCE_CACHE_SIZE:
+                self.sources.popitem(last=False)
+        return source
+
+    def get_image(self, hotdeal_id, preset, ext):
+        """반환값: (이미지 바이트, 포맷, ETag 키, 응답 계층)"""
+        config = SERVER_PRESETS.get(preset)
+        if config is None:
+            raise ImageNotFound(f"알 수 없는 프리셋: {preset}")
+        fmt = EXTENSION_FORMATS.get(ext)
+        formats = [name for name, _ in get_output_formats(config)]
+        if fmt not in formats:
+            raise ImageNotFound(f"{preset} 프리셋은 {', '.join(formats)} 포맷만 제공")
+
+        source = self.resolve_source(hotdeal_id)
+        stat = source.stat()
+        fingerprint = self.processor.get_variant_fingerprint(config)
+        key = hashlib.blake2b(
+            f"{source.resolve()}|{stat.st_size}|{stat.st_mtime_ns}|{preset}|{fingerprint}".encode(), digest_size=16
+        ).hexdigest()
+        ext = OUTPUT_FORMATS[fmt]["ext"]
+
+        tier = "memory"
+        data = self.memory.get((key, fmt))
+        if data is None:
+            tier = "disk"
+            data = self.disk.read(self.disk.path_for(key, ext))
+        if data is None:
+            tier = "batch"
+            data = self.read_batch_output(hotdeal_id, source, stat, preset, config, fingerprint, ext)
+        if data is None:
+            rendered, shared = self.flight.do(key, lambda: self.render(source, preset, config, key))
+            tier = "shared" if shared else "render"
+            data = rendered[fmt]
+        if tier != "memory":
+            self.memory.put((key, fmt), data)
+
+        with self.lock:
+            self.counters[tier] += 1
+        return data, fmt, key, tier
+
+    def read_batch_output(self, hotdeal_id, source, stat, preset, config, fingerprint, ext):
+        """배치 처리기가 같은 원본/설정으로 이미 만든 결과 (번들 우선, 없으면 저장소(CAS)) - 없으면 None"""
+        if preset not in processor_module.HOTDEAL_IMAGE_SIZES or self.manifest() is None:
+            return None
+        entry = self.manifest().get(str(source))
+        if (entry is None or entry.get("original_size") != stat.st_size or entry.get("mtime_ns") != stat.st_mtime_ns
+                or entry.get("variants", {}).get(preset) != fingerprint):
+            return None
+        if self.bundle is not None and entry.get("layout") == "bundle":
+            data = self.bundle.read(get_variant_name(hotdeal_id, preset, ext))
+            if data is not None:
+                return data
+        cas_path = self.processor.get_cas_path(entry.get("cas_hash", entry["hash"]), config)
+        try:
+            return cas_path.with_suffix("." + ext).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def render(self, source, preset, config, key):
+        """원본을 축소 디코드 후 프리셋의 모든 포맷을 디스크 캐시에 생성 - {포맷: 바이트}"""
+        output_path = self.disk.path_for(key, "jpg")
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.render_slots:
+            with Image.open(source) as img:
+                img = decode_reduced(img, [config["size"]], self.processor.max_pixels)
+                img = flatten_to_rgb(img)
+                _, format_sizes = self.processor.create_resized_image(img, output_path, config, preset)
+
+        rendered = {}
+        for fmt in format_sizes:
+            path = output_path.with_suffix("." + OUTPUT_FORMATS[fmt]["ext"])
+            rendered[fmt] = path.read_bytes()
+            self.disk.add(path)
+        return rendered
+
+    def get_stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+        return {
+            "requests": counters,
+            "memory_cache": {"entries": len(self.memory.entries), "bytes": self.memory.total_bytes},
+            "disk_cache": {"files": len(self.disk.entries), "bytes": self.disk.total_bytes,
+                           "evicted": self.disk.evicted},
+            "stages": {stage: {"count": count, "seconds": round(seconds, 3)}
+                       for stage, (count, seconds) in self.processor.metrics.stage_totals().items()},
+        }
+
+class ImageRequestHandler(BaseHTTPRequestHandler):
+    server_version = "HiKoImageServer/1.0"
+
+    def do_GET(self):
+        self.handle_image_request(send_body=True)
+
+    def do_HEAD(self):
+        self.handle_image_request(send_body=False)
+
+    def handle_image_request(self, send_body):
+        images = self.server.images
+        path = urlsplit(self.path).path
+        if path == "/stats":
+            body = json.dumps(images.get_stats(), ensure_ascii=False).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if send_body:
+                self.wfile.write(body)
+            return
+
+        match = IMAGE_ROUTE.fullmatch(path)
+        if match is None:
+            self.send_error(404, explain="경로 형식: /images/<핫딜 ID>/<프리셋>.<포맷>")
+            return
+
+        try:
+            data, fmt, key, tier = images.get_image(*match.groups())
+        except ImageNotFound as e:
+            self.send_error(404, explain=str(e))
+            return
+        except (ImageBudgetError, Image.DecompressionBombError) as e:
+            self.send_error(422, explain=str(e))
+            return
+        except Exception as e:
+            self.log_error("렌더링 실패 %s: %s", path, e)
+            self.send_error(500, explain=str(e))
+            return
+
+        etag = f'"{key}-{fmt}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPES[fmt])
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", CACHE_CONTROL)
+        self.send_header("ETag", etag)
+        self.send_header("X-Image-Cache", tier)
+        self.end_headers()
+        if send_body:
+            self.wfile.write(data)
+
+class ImageServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, images):
+        super().__init__(address, ImageRequestHandler)
+        self.images = images
+
+def main():
+    parser = argparse.ArgumentParser(description="HiKo 온디맨드 이미지 서버")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="바인드 주소")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="포트")
+    parser.add_argument("--source-dir", action="append", default=[],
+                        help="원본 이미지 디렉토리 (<핫딜 ID>.<확장자>, 여러 번 지정 가능)")
+    parser.add_argument("--manifest", default=str(processor_module.MANIFEST_PATH),
+                        help="배치 처리 매니페스트 (원본 경로 조회 및 배치 결과 재사용)")
+    parser.add_argument("--cache-dir", default=str(DISK_CACHE_DIR), help="디스크 캐시 디렉토리")
+    parser.add_argument("--memory-cache-mb", type=int, default=MEMORY_CACHE_MB, help="메모리 LRU 용량 (MB)")
+    parser.add_argument("--disk-cache-mb", type=int, default=DISK_CACHE_MB, help="디스크 캐시 용량 (MB)")
+    parser.add_argument("--max-age-days", type=float, default=DISK_CACHE_MAX_AGE_DAYS,
+                        help="이 기간 동안 요청이 없는 디스크 캐시 파일 삭제 (일)")
+    parser.add_argument("--render-workers", type=int, help="동시 렌더링 수 (기본: CPU 수)")
+    parser.add_argument("--max-pixels", type=int, default=MAX_DECODE_PIXELS,
+                        help="디코드할 최대 픽셀 수 (초과 시 422)")
+    parser.add_argument("--bundle-dir", default=str(processor_module.CACHE_DIR / BUNDLE_DIR_NAME),
+                        help="배치 처리 bundle 레이아웃 디렉토리 (있으면 배치 결과를 세그먼트에서 읽음)")
+    args = parser.parse_args()
+
+    images = OnDemandImages(
+        args.source_dir, args.manifest, args.cache_dir,
+        memory_bytes=args.memory_cache_mb * 1024 * 1024,
+        disk_bytes=args.disk_cache_mb * 1024 * 1024,
+        max_age=args.max_age_days * 86400,
+        render_workers=args.render_workers,
+        max_pixels=args.max_pixels,
+        bundle_dir=args.bundle_dir,
+    )
+    server = ImageServer((args.host, args.port), images)
+    print(f"🖼️  이미지 서버 시작: http://{args.host}:{args.port}/images/<핫딜 ID>/<프리셋>.<포맷>")
+    print(f"  - 프리셋 {len(SERVER_PRESETS)}개, 디스크 캐시 {args.cache_dir} ({args.disk_cache_mb}MB)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n✓ 이미지 서버 종료")
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+HiKo 이미지 처리 공통 모듈
+리사이즈 스크립트들이 함께 사용하는 디코드/지오메트리/인코딩 헬퍼
+"""
+
+import hashlib
+import importlib.util
+import io
+import json
+import math
+import os
+import shutil
+import sys
+from contextlib import nullcontext
+from pathlib import Path
+
+from PIL import Image
+
+try:
+    import numpy as np
+except ImportError:  # SSIM 기반 적응형 인코딩에만 필요
+    np = None
+
+# 축소 디코드 후 최종 LANCZOS 필터까지 남겨둘 최소 배율
+# (DCT 스케일링/정수 축소 자체가 안티앨리어싱을 하므로 Pillow 기본값 2.0보다 약간 작게 설정)
+DECODE_GAP = 1.5
+
+# 정수 배율 사전 축소(reduce)를 지원하는 모드
+REDUCIBLE_MODES = ('RGB', 'RGBA', 'L', 'LA')
+
+# 픽셀 예산: 실제로 디코드될 크기(JPEG은 축소 디코드 적용 후)가 이보다 크면 디코드 전에 거부
+# (파노라마/압축 폭탄 이미지가 워커 메모리를 넘기지 않도록, 극단적인 크기는 Pillow 자체 검사도 적용됨)
+MAX_DECODE_PIXELS = 40_000_000
+
+# 예상 작업 메모리 = 디코드 버퍼 x 배수 (RGB 정규화/리사이즈 사본 포함)
+WORKING_SET_FACTOR = 2
+
+# 출력 포맷별 확장자 / Pillow 포맷 이름 / 기본 저장 옵션
+OUTPUT_FORMATS = {
+    "jpeg": {"ext": "jpg", "pil": "JPEG", "options": {"optimize": True}},
+    "webp": {"ext": "webp", "pil": "WEBP", "options": {"method": 4}},
+    "avif": {"ext": "avif", "pil": "AVIF", "options": {"speed": 6}},
+}
+
+# 적응형 인코딩 기본값 - 설정의 "adaptive"로 덮어씀
+# min_ssim: 리사이즈 결과 대비 최소 SSIM, target_bytes: 바이트 예산 (None이면 미사용)
+# 품질은 min_quality ~ max_quality 범위에서 이진 탐색 (설정의 고정 품질 대신 사용)
+DEFAULT_ADAPTIVE = {"min_ssim": 0.95, "target_bytes": None, "min_quality": 40, "max_quality": 95}
+
+# SSIM 계산 블록 크기 / 안정화 상수
+SSIM_BLOCK = 8
+SSIM_C1 = (0.01 * 255) ** 2
+SSIM_C2 = (0.03 * 255) ** 2
+
+# 지원되지 않아 건너뛴 포맷/기능 (경고는 한 번만 출력)
+_unsupported_warned = set()
+
+class ImageBudgetError(ValueError):
+    """픽셀 예산 초과 - 디코드 전에 거부된 이미지"""
+
+def load_script_module(name):
+    """
+    scripts/ 안의 하이픈 이름 스크립트(hotdeal-image-processor.py 등)를 모듈로 로드
+    모듈 이름은 하이픈을 밑줄로 바꾼 이름 (프로세스 풀에서 함수 피클링이 가능하도록 sys.modules에 등록)
+    """
+    module_name = name.replace("-", "_")
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+
+    spec = importlib.util.spec_from_file_location(module_name, Path(__file__).with_name(f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def get_cover_size(img_size, size):
+    """목표 크기를 완전히 덮는 리사이즈 크기 계산 (비율 유지)"""
+    img_ratio = img_size[0] / img_size[1]
+    target_ratio = size[0] / size[1]
+
+    if img_ratio > target_ratio:
+        # 이미지가 더 넓음 - 높이 기준으로 리사이즈
+        new_height = size[1]
+        new_width = int(new_height * img_ratio)
+    else:
+        # 이미지가 더 높음 - 너비 기준으로 리사이즈
+        new_width = size[0]
+        new_height = int(new_width / img_ratio)
+
+    return new_width, new_height
+
+def get_fit_size(img_size, size):
+    """목표 크기 안에 들어가는 리사이즈 크기 (비율 유지, 확대하지 않음 - Image.thumbnail과 같은 반올림)"""
+    if size[0] >= img_size[0] and size[1] >= img_size[1]:
+        return tuple(img_size)
+
+    aspect = img_size[0] / img_size[1]
+    width, height = size
+    if width / height >= aspect:
+        candidates = (math.floor(height * aspect), math.ceil(height * aspect))
+        width = max(min(candidates, key=lambda n: abs(aspect - n / height)), 1)
+    else:
+        candidates = (math.floor(width / aspect), math.ceil(width / aspect))
+        height = max(min(candidates, key=lambda n: abs(aspect - width / n) if n else 0), 1)
+    return width, height
+
+def plan_crop_box(img_size, size, scaled_size=None):
+    """
+    크롭 영역 계획 - 원본을 scaled_size(기본: 커버 크기)로 리사이즈한 뒤 size만큼 중앙 크롭하는 것과 같은 원본 좌표 영역
+    img.resize(size, box=영역)은 크롭될 영역만 리샘플링하므로 잘려 나갈 픽셀을 계산하지 않음
+    (전체 리사이즈 후 크롭과 반올림 차이(±1) 이내로 같은 결과)
+    """
+    scaled_w, scaled_h = scaled_size or get_cover_size(img_size, size)
+    left = (scaled_w - size[0]) // 2
+    top = (scaled_h - size[1]) // 2
+    scale_x = img_size[0] / scaled_w
+    scale_y = img_size[1] / scaled_h
+    return (left * scale_x, top * scale_y, (left + size[0]) * scale_x, (top + size[1]) * scale_y)
+
+def resize_cover(img, size, resample=Image.Resampling.LANCZOS):
+    """목표 크기를 덮도록 리사이즈 + 중앙 크롭 (크롭 영역만 리샘플링)"""
+    return img.resize(size, resample, box=plan_crop_box(img.size, size))
+
+def plan_decode_size(img_size, target_sizes):
+    """디코드 계획 - 모든 목표 크기를 덮는 데 필요한 최소 디코드 크기 (DECODE_GAP 포함)"""
+    need_w = need_h = 0
+    for size in target_sizes:
+        cover_w, cover_h = get_cover_size(img_size, size)
+        need_w = max(need_w, cover_w)
+        need_h = max(need_h, cover_h)
+
+    return int(need_w * DECODE_GAP), int(need_h * DECODE_GAP)
+
+def prepare_decode(img, target_sizes, max_pixels=MAX_DECODE_PIXELS):
+    """
+    디코드 준비 (헤더만 읽은 상태에서 호출)
+    JPEG은 축소 디코드(draft)를 먼저 적용하고, 실제로 디코드될 크기로 픽셀 예산을 확인
+    반환값: 예상 작업 메모리 (바이트) - 예산 초과 시 ImageBudgetError
+    """
+    if img.format == 'JPEG':
+        # 요청 크기 이상을 보장하는 가장 작은 1/2, 1/4, 1/8 스케일로 디코드 (두 번째 호출은 무시됨)
+        img.draft(None, plan_decode_size(img.size, target_sizes))
+
+    pixels = img.width * img.height
+    if max_pixels is not None and pixels > max_pixels:
+        raise ImageBudgetError(f"픽셀 예산 초과: {img.width}x{img.height} ({pixels:,} > {max_pixels:,})")
+    return pixels * len(img.getbands()) * WORKING_SET_FACTOR
+
+def decode_reduced(img, target_sizes, max_pixels=MAX_DECODE_PIXELS):
+    """
+    축소 디코드
+    JPEG은 DCT 도메인 축소(draft), 그 외 포맷은 정수 배율 사전 축소(reduce) 적용
+    Image.open 직후(load 전)의 이미지를 받아 디코드된 이미지를 반환 (픽셀 예산 초과 시 ImageBudgetError)
+    """
+    prepare_decode(img, target_sizes, max_pixels)
+    need_w, need_h = plan_decode_size(img.size, target_sizes)
+
+    img.load()
+
+    factor = min(img.width // max(need_w, 1), img.height // max(need_h, 1))
+    if factor >= 2 and img.mode in REDUCIBLE_MODES:
+        img = img.reduce(factor)
+
+    return img
+
+def flatten_to_rgb(img):
+    """JPEG 저장을 위해 RGB로 정규화 (투명 영역은 흰 배경으로 합성)"""
+    if img.mode in ('RGBA', 'LA'):
+        # 알파 채널을 바로 마스크로 사용 (밴드 분리 사본 없이)
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img)
+        return background
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+def vertical_gradient(size, formula):
+    """
+    세로 그라디언트 배경 생성 (행 단위 draw.line 루프 대체)
+    formula(y)는 행 위치 y로 (r, g, b)를 계산하는 산술식 - numpy가 있으면 모든 행을 배열 연산 한 번으로 계산
+    채널 값은 int()와 같이 소수점 이하를 버리고, 1픽셀 폭 띠를 가로로 늘려 이미지를 만듦
+    """
+    width, height = size
+    if np is not None:
+        y = np.arange(height, dtype=np.float64)
+        channels = [np.broadcast_to(np.asarray(value, dtype=np.float64), (height,)) for value in formula(y)]
+        rows = np.stack(channels, axis=1).astype(np.int64).clip(0, 255).astype(np.uint8)
+        strip = Image.frombytes('RGB', (1, height), rows.tobytes())
+    else:
+        strip = Image.new('RGB', (1, height))
+        strip.putdata([tuple(int(value) for value in formula(y)) for y in range(height)])
+    return strip.resize((width, height), Image.Resampling.NEAREST)
+
+def is_format_supported(fmt):
+    """현재 Pillow 빌드에서 저장 가능한 포맷인지 확인 (AVIF는 플러그인 필요할 수 있음)"""
+    Image.init()
+    return fmt in OUTPUT_FORMATS and OUTPUT_FORMATS[fmt]["pil"] in Image.SAVE
+
+def get_output_formats(config):
+    """
+    설정의 출력 포맷 목록 [(포맷, 품질), ...]
+    "formats"가 없으면 기존처럼 JPEG 하나 ("quality" 사용), 지원되지 않는 포맷은 제외
+    """
+    formats = config.get("formats") or [{"format": "jpeg", "quality": config["quality"]}]
+
+    result = []
+    for entry in formats:
+        fmt = entry["format"]
+        if not is_format_supported(fmt):
+            if fmt not in _unsupported_warned:
+                _unsupported_warned.add(fmt)
+                print(f"⚠️  {fmt} 저장을 지원하지 않는 Pillow 빌드 - 해당 포맷은 건너뜀")
+            continue
+        result.append((fmt, entry.get("quality", config.get("quality", 85))))
+    return result
+
+def encode_image(img, fmt, quality, **options):
+    """이미지를 지정 포맷으로 인코딩한 바이트 반환"""
+    buffer = io.BytesIO()
+    save_options = dict(OUTPUT_FORMATS[fmt]["options"], **options)
+    img.save(buffer, OUTPUT_FORMATS[fmt]["pil"], quality=quality, **save_options)
+    return buffer.getvalue()
+
+def get_adaptive_settings(config):
+    """적응형 인코딩 설정 (기본값 + 설정의 "adaptive")"""
+    return dict(DEFAULT_ADAPTIVE, **config.get("adaptive", {}))
+
+def compute_ssim(reference, data):
+    """
+    인코딩 결과와 기준 이미지의 SSIM (그레이스케일, SSIM_BLOCK 크기 블록 평균)
+    reference는 float 그레이스케일 배열
+    """
+    with Image.open(io.BytesIO(data)) as decoded:
+        candidate = np.asarray(decoded.convert('L'), dtype=np.float64)
+
+    h = reference.shape[0] // SSIM_BLOCK * SSIM_BLOCK
+    w = reference.shape[1] // SSIM_BLOCK * SSIM_BLOCK
+    if h == 0 or w == 0:
+        return 1.0
+
+    def blocks(arr):
+        arr = arr[:h, :w].reshape(h // SSIM_BLOCK, SSIM_BLOCK, w // SSIM_BLOCK, SSIM_BLOCK)
+        return arr.transpose(0, 2, 1, 3).reshape(-1, SSIM_BLOCK * SSIM_BLOCK)
+
+    x, y = blocks(reference), blocks(candidate)
+    mu_x, mu_y = x.mean(axis=1), y.mean(axis=1)
+    var_x, var_y = x.var(axis=1), y.var(axis=1)
+    cov = ((x - mu_x[:, None]) * (y - mu_y[:, None])).mean(axis=1)
+
+    ssim = ((2 * mu_x * mu_y + SSIM_C1) * (2 * cov + SSIM_C2)) / \
+           ((mu_x ** 2 + mu_y ** 2 + SSIM_C1) * (var_x + var_y + SSIM_C2))
+    return float(ssim.mean())
+
+def choose_adaptive_quality(img, fmt, settings, **options):
+    """
+    품질 이진 탐색
+    - min_ssim: 기준(리사이즈 결과) 대비 SSIM을 만족하는 가장 낮은 품질
+    - target_bytes: 예산 이하가 되는 가장 높은 품질 (둘 다 있으면 예산 우선)
+    반환값: (선택된 품질, 인코딩된 바이트)
+    """
+    low, high = settings["min_quality"], settings["max_quality"]
+    encoded = {}
+
+    def encode(quality):
+        if quality not in encoded:
+            encoded[quality] = encode_image(img, fmt, quality, **options)
+        return encoded[quality]
+
+    quality = high
+
+    min_ssim = settings.get("min_ssim")
+    if min_ssim is not None:
+        if np is None:
+            if "numpy" not in _unsupported_warned:
+                _unsupported_warned.add("numpy")
+                print("⚠️  numpy가 없어 SSIM 기준 적응형 인코딩은 건너뜀 (바이트 예산만 적용)")
+        else:
+            reference = np.asarray(img.convert('L'), dtype=np.float64)
+            lo, hi = low, high
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if compute_ssim(reference, encode(mid)) >= min_ssim:
+                    hi = mid
+                else:
+                    lo = mid + 1
+            quality = lo
+
+    target_bytes = settings.get("target_bytes")
+    if target_bytes is not None and len(encode(quality)) > target_bytes:
+        lo, hi = low, quality
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if len(encode(mid)) <= target_bytes:
+                lo = mid
+            else:
+                hi = mid - 1
+        quality = lo
+
+    return quality, encode(quality)
+
+def adaptive_cache_key(size_name, fmt, settings):
+    """적응형 품질 캐시 키 (사이즈/포맷별, 목표 설정이 바뀌면 다른 키)"""
+    digest = hashlib.blake2b(json.dumps(settings, sort_keys=True).encode(), digest_size=6).hexdigest()
+    return f"{size_name}:{fmt}:{digest}"
+
+def encode_adaptive(img, fmt, settings, quality_cache=None, cache_prefix="", **options):
+    """적응형 인코딩 - 캐시된 품질이 있으면 바로 인코딩, 없으면 탐색 후 캐시에 기록"""
+    key = adaptive_cache_key(cache_prefix, fmt, settings)
+    cached = quality_cache.get(key) if quality_cache is not None else None
+    if cached is not None:
+        return encode_image(img, fmt, cached, **options)
+
+    chosen, data = choose_adaptive_quality(img, fmt, settings, **options)
+    if quality_cache is not None:
+        quality_cache[key] = chosen
+    return data
+
+def save_formats(img, output_path, config, adaptive=False, quality_cache=None, cache_prefix="",
+                 timer=None, **jpeg_options):
+    """
+    같은 이미지 버퍼를 설정된 모든 포맷으로 저장
+    output_path의 확장자만 포맷별로 바꿔서 저장하고 {포맷: 바이트 수} 반환
+    adaptive이면 포맷별 품질을 탐색하고, 선택된 품질은 quality_cache(dict)에 기록/재사용
+    timer(stage)가 주어지면 인코딩("encode")/쓰기("write") 구간을 각각 계측
+    """
+    output_path = Path(output_path)
+    settings = get_adaptive_settings(config)
+    timer = timer or (lambda stage: nullcontext())
+    sizes = {}
+    for fmt, quality in get_output_formats(config):
+        options = jpeg_options if fmt == "jpeg" else {}
+        with timer("encode"):
+            if adaptive:
+                data = encode_adaptive(img, fmt, settings, quality_cache, cache_prefix, **options)
+            else:
+                data = encode_image(img, fmt, quality, **options)
+        with timer("write"):
+            write_atomic(output_path.with_suffix("." + OUTPUT_FORMATS[fmt]["ext"]), data)
+        sizes[fmt] = len(data)
+    return sizes
+
+def write_atomic(path, data):
+    """임시 파일에 쓴 뒤 교체 (같은 결과를 동시에 쓰는 워커나 읽는 쪽이 쓰다 만 파일을 보지 않도록)"""
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def link_or_copy(src, dst):
+    """src를 dst에 하드링크 (다른 파일 시스템 등으로 불가능하면 복사) - 기존 dst는 원자적으로 교체"""
+    dst = Path(dst)
+    if dst.exists() and os.path.samefile(src, dst):
+        return
+
+    tmp_path = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+    if tmp_path.exists():
+        tmp_path.unlink()
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        shutil.copy2(src, tmp_path)
+    os.replace(tmp_path, dst)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+HiKo 핫딜 레코드 스트리밍 입력
+JSON 배열 / JSON lines 파일을 전체를 메모리에 올리지 않고 레코드 단위로 읽고,
+핫딜 ID 해시로 샤드를 나눠 여러 머신이 전체 카탈로그를 나눠 처리할 수 있게 함
+"""
+
+import hashlib
+import json
+import sys
+
+# 한 번에 읽는 텍스트 크기 (레코드가 이보다 크면 버퍼를 늘려 가며 다시 시도)
+READ_CHUNK_SIZE = 64 * 1024
+
+def iter_json_records(path, chunk_size=READ_CHUNK_SIZE):
+    """
+    JSON 배열(`[{...}, {...}]`) 또는 JSON lines(한 줄에 객체 하나) 파일의 객체를 하나씩 반환
+    path가 "-"이면 stdin에서 읽음. 객체가 아닌 값이 있으면 ValueError
+    """
+    decoder = json.JSONDecoder()
+    f = sys.stdin if str(path) == "-" else open(path, 'r', encoding='utf-8')
+    try:
+        buffer = ""
+        pos = 0
+        eof = False
+        in_array = None
+        offset = 0  # 버퍼 앞에서 버린 문자 수 (에러 위치 표시용)
+
+        while True:
+            # 공백/구분자 건너뛰기 - 버퍼 끝에 닿으면 더 읽기
+            while pos < len(buffer) and (buffer[pos].isspace() or (in_array and buffer[pos] == ',')):
+                pos += 1
+            if pos >= len(buffer):
+                if eof:
+                    if in_array:
+                        raise ValueError(f"{path}: JSON 배열이 닫히지 않음")
+                    return
+                offset += pos
+                buffer, pos = f.read(chunk_size), 0
+                eof = not buffer
+                continue
+
+            if in_array is None:
+                # 첫 글자로 형식 판별 (배열이 아니면 JSON lines / 연속된 객체)
+                in_array = buffer[pos] == '['
+                if in_array:
+                    pos += 1
+                continue
+            if in_array and buffer[pos] == ']':
+                return
+
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise ValueError(f"{path}: {offset + pos}번째 문자에서 JSON 파싱 실패")
+                # 레코드가 버퍼 경계에 걸림 - 이미 읽은 부분은 버리고 이어서 읽기
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                offset += pos
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+
+            if not isinstance(record, dict):
+                raise ValueError(f"{path}: {offset + pos}번째 문자의 값이 객체가 아님")
+            yield record
+            pos = end
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def parse_shard(value):
+    """`--shard i/N` 값 파싱 - (i, N) 반환 (0 <= i < N)"""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise ValueError(f"샤드 형식이 잘못됨 (i/N): {value}")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"샤드 번호가 범위를 벗어남 (0 <= i < N): {value}")
+    return index, count
+
+def shard_of(hotdeal_id, count):
+    """핫딜 ID의 샤드 번호 - 머신/프로세스/파이썬 버전과 무관하게 같은 값 (내장 hash()는 실행마다 달라짐)"""
+    digest = hashlib.blake2b(str(hotdeal_id).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % count
+
+def iter_shard(records, shard=None):
+    """shard=(i, N)이면 i번 샤드에 속한 레코드만 반환 (ID가 없는 레코드는 제외)"""
+    for record in records:
+        if record.get("id") is None:
+            continue
+        if shard is None or shard_of(record["id"], shard[1]) == shard[0]:
+            yield record
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+HiKo 핫딜 이미지 출력 레이아웃
+- flat: <루트>/<핫딜 ID>/<핫딜 ID>_<사이즈>.<확장자> (핫딜마다 디렉토리)
+- fanout: <루트>/<ID 해시 2자리>/<다음 2자리>/<핫딜 ID>_<사이즈>.<확장자> (디렉토리 최대 65536개)
+- bundle: 변형을 큰 세그먼트 파일에 이어 붙이고, 정렬된 고정 폭 오프셋 인덱스(mmap)로 조회
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+
+from image_common import write_atomic
+
+LAYOUTS = ("flat", "fanout", "bundle")
+DEFAULT_LAYOUT = "flat"
+
+# 번들 디렉토리 (레이아웃 루트 아래)
+BUNDLE_DIR_NAME = "_bundles"
+# 세그먼트가 이 크기를 넘으면 다음 세그먼트에 기록
+SEGMENT_MAX_BYTES = 256 * 1024 * 1024
+# 저널 항목이 이만큼 쌓이면 정렬 인덱스에 합침 (그 전까지는 저널을 메모리에 올려 조회)
+JOURNAL_COMPACT_ENTRIES = 65536
+# 읽기 전용 인덱스가 다른 프로세스의 기록을 확인하는 최소 간격 (초)
+REFRESH_INTERVAL = 1.0
+
+# 인덱스 파일: 헤더(매직, 항목 수) + 키 순으로 정렬된 항목
+# 항목: 이름의 blake2b 16바이트 키, 세그먼트 번호, 길이, 세그먼트 내 오프셋 (32바이트 고정 폭)
+INDEX_MAGIC = b"HIKOBIX1"
+INDEX_HEADER = struct.Struct("<8sQ")
+INDEX_ENTRY = struct.Struct("<16sIIQ")
+KEY_SIZE = 16
+
+def get_variant_name(hotdeal_id, size_name, ext):
+    """레이아웃과 무관한 변형 이름 (flat 레이아웃의 상대 경로이자 번들 키)"""
+    return f"{hotdeal_id}/{hotdeal_id}_{size_name}.{ext}"
+
+def get_variant_path(root, layout, hotdeal_id, size_name, ext):
+    """flat/fanout 레이아웃의 변형 파일 경로 (bundle은 파일이 없으므로 get_variant_name으로 조회)"""
+    if layout == "fanout":
+        digest = hashlib.blake2b(str(hotdeal_id).encode('utf-8'), digest_size=2).hexdigest()
+        return Path(root) / digest[:2] / digest[2:] / f"{hotdeal_id}_{size_name}.{ext}"
+    return Path(root) / get_variant_name(hotdeal_id, size_name, ext)
+
+def bundle_key(name):
+    """번들 인덱스 키 (이름의 blake2b 16바이트)"""
+    return hashlib.blake2b(name.encode('utf-8'), digest_size=KEY_SIZE).digest()
+
+class BundleIndex:
+    """
+    번들 읽기 - 정렬 인덱스(index.bin)는 mmap 후 이진 탐색, 아직 합쳐지지 않은 저널(journal.bin)은 메모리에서 조회
+    조회 결과: (세그먼트 번호, 오프셋, 길이). 여러 스레드에서 공유 가능
+    """
+
+    def __init__(self, bundle_dir, refresh_interval=REFRESH_INTERVAL):
+        self.bundle_dir = Path(bundle_dir)
+        self.index_path = self.bundle_dir / "index.bin"
+        self.journal_path = self.bundle_dir / "journal.bin"
+        self.refresh_interval = refresh_interval
+        self.lock = threading.Lock()
+        self.journal = {}
+        self._index_map = None
+        self._index_count = 0
+        self._index_id = None
+        self._journal_read = 0
+        self._segments = {}
+        self._checked_at = 0.0
+        self._load_index()
+        self._read_journal()
+
+    def segment_path(self, segment):
+        return self.bundle_dir / f"segment-{segment:05d}.bin"
+
+    def _load_index(self):
+        """정렬 인덱스 다시 열기 - 교체된 파일(원자적 rename)을 새로 mmap"""
+        self._index_map = None
+        self._index_count = 0
+        self._index_id = None
+        try:
+            with open(self.index_path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                index_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return
+        magic, count = INDEX_HEADER.unpack_from(index_map, 0)
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"번들 인덱스 형식이 아님: {self.index_path}")
+        self._index_map = index_map
+        self._index_count = count
+        self._index_id = (stat.st_ino, stat.st_mtime_ns)
+
+    def _read_journal(self):
+        """저널에서 아직 읽지 않은 항목 읽기 (기록 중인 마지막 불완전 항목은 제외)"""
+        try:
+            with open(self.journal_path, 'rb') as f:
+                f.seek(self._journal_read)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        usable = len(data) - len(data) % INDEX_ENTRY.size
+        for key, segment, length, offset in INDEX_ENTRY.iter_unpack(data[:usable]):
+            self.journal[key] = (segment, offset, length)
+        self._journal_read += usable
+
+    def refresh(self):
+        """다른 프로세스(처리기)가 추가한 항목 반영 - refresh_interval마다 인덱스/저널 크기만 확인"""
+        if self.refresh_interval is None or time.monotonic() - self._checked_at < self.refresh_interval:
+            return
+        self._checked_at = time.monotonic()
+        try:
+            stat = self.index_path.stat()
+            index_id = (stat.st_ino, stat.st_mtime_ns)
+        except FileNotFoundError:
+            index_id = None
+        try:
+            journal_size = self.journal_path.stat().st_size
+        except FileNotFoundError:
+            journal_size = 0
+
+        if index_id != self._index_id or journal_size < self._journal_read:
+            # 인덱스에 합쳐지고 저널이 비워짐 - 처음부터 다시 읽기
+            self.journal = {}
+            self._journal_read = 0
+            self._load_index()
+        self._read_journal()
+
+    def _search(self, key):
+        """정렬 인덱스 이진 탐색"""
+        index_map = self._index_map
+        low, high = 0, self._index_count
+        while low < high:
+            mid = (low + high) // 2
+            pos = INDEX_HEADER.size + mid * INDEX_ENTRY.size
+            mid_key = index_map[pos:pos + KEY_SIZE]
+            if mid_key < key:
+                low = mid + 1
+            elif mid_key > key:
+                high = mid
+            else:
+                _, segment, length, offset = INDEX_ENTRY.unpack_from(index_map, pos)
+                return segment, offset, length
+        return None
+
+    def lookup_key(self, key):
+        location = self.journal.get(key)
+        if location is None and self._index_map is not None:
+            location = self._search(key)
+        return location
+
+    def lookup(self, name):
+        """이름의 위치 (세그먼트 번호, 오프셋, 길이) - 없으면 None"""
+        with self.lock:
+            self.refresh()
+            return self.lookup_key(bundle_key(name))
+
+    def read(self, name):
+        """이름의 바이트 - 없으면 None"""
+        location = self.lookup(name)
+        if location is None:
+            return None
+        segment, offset, length = location
+        with self.lock:
+            fd = self._segments.get(segment)
+            if fd is None:
+                fd = self._segments[segment] = os.open(self.segment_path(segment), os.O_RDONLY)
+        return os.pread(fd, length, offset)
+
+    def iter_index(self):
+        """정렬 인덱스 항목 순회 (키, 세그먼트, 길이, 오프셋)"""
+        for i in range(self._index_count):
+            yield INDEX_ENTRY.unpack_from(self._index_map, INDEX_HEADER.size + i * INDEX_ENTRY.size)
+
+    def close(self):
+        with self.lock:
+            for fd in self._segments.values():
+                os.close(fd)
+            self._segments = {}
+            self._index_map = None
+
+class BundleWriter(BundleIndex):
+    """
+    번들 기록 (한 프로세스만 사용) - 세그먼트에 바이트를 덧붙인 뒤 저널에 위치를 기록
+    중간에 중단되면 저널에 기록되지 않은 바이트만 버려지고, 인덱스는 항상 기록된 항목만 가리킴
+    같은 저장소(CAS) 파일은 한 번만 덧붙이고 이를 쓰는 핫딜은 같은 위치를 가리킴
+    """
+
+    def __init__(self, bundle_dir):
+        Path(bundle_dir).mkdir(parents=True, exist_ok=True)
+        super().__init__(bundle_dir, refresh_interval=None)
+
+        # 마지막 기록이 중간에 끊겼으면 불완전한 저널 항목 제거
+        self.journal_file = open(self.journal_path, 'ab')
+        self.journal_file.truncate(self._journal_read)
+
+        segments = sorted(int(path.stem.split("-")[1]) for path in self.bundle_dir.glob("segment-*.bin"))
+        self.segment = segments[-1] if segments else 0
+        self.segment_file = open(self.segment_path(self.segment), 'ab')
+        self.segment_size = self.segment_file.tell()
+
+    def append(self, data):
+        """현재 세그먼트에 덧붙이기 (크기를 넘으면 다음 세그먼트) - (세그먼트 번호, 오프셋, 길이) 반환"""
+        if self.segment_size and self.segment_size + len(data) > SEGMENT_MAX_BYTES:
+            self.segment_file.close()
+            self.segment += 1
+            self.segment_file = open(self.segment_path(self.segment), 'ab')
+            self.segment_size = 0
+
+        location = (self.segment, self.segment_size, len(data))
+        self.segment_file.write(data)
+        self.segment_file.flush()
+        self.segment_size += len(data)
+        return location
+
+    def record(self, key, location):
+        """키의 위치를 저널에 기록 (같은 위치면 생략)"""
+        if self.lookup_key(key) == location:
+            return
+        segment, offset, length = location
+        self.journal_file.write(INDEX_ENTRY.pack(key, segment, length, offset))
+        self.journal_file.flush()
+        self.journal[key] = location
+
+    def put_file(self, name, source_path):
+        """source_path(저장소 파일)의 내용을 name으로 기록 - 같은 파일은 이미 기록된 위치를 재사용"""
+        source_path = Path(source_path)
+        content_key = bundle_key("cas:" + source_path.name)
+        location = self.lookup_key(content_key)
+        if location is None:
+            location = self.append(source_path.read_bytes())
+            self.record(content_key, location)
+        self.record(bundle_key(name), location)
+
+    def flush(self):
+        """저널이 충분히 쌓였으면 정렬 인덱스에 합침"""
+        if len(self.journal) >= JOURNAL_COMPACT_ENTRIES:
+            self.compact()
+
+    def compact(self):
+        """기존 정렬 인덱스와 저널을 키 순으로 병합해 인덱스를 교체하고 저널 비우기"""
+        if not self.journal:
+            return
+        pending = sorted(self.journal.items())
+        out = bytearray(INDEX_HEADER.size)
+        count = 0
+        j = 0
+        for key, segment, length, offset in self.iter_index():
+            while j < len(pending) and pending[j][0] <= key:
+                if pending[j][0] == key:
+                    segment = None
+                pending_key, (pending_segment, pending_offset, pending_length) = pending[j]
+                out += INDEX_ENTRY.pack(pending_key, pending_segment, pending_length, pending_offset)
+                count += 1
+                j += 1
+            if segment is not None:
+                out += INDEX_ENTRY.pack(key, segment, length, offset)
+                count += 1
+        for pending_key, (pending_segment, pending_offset, pending_length) in pending[j:]:
+            out += INDEX_ENTRY.pack(pending_key, pending_segment, pending_length, pending_offset)
+            count += 1
+        INDEX_HEADER.pack_into(out, 0, INDEX_MAGIC, count)
+
+        # 인덱스 교체 후 저널 비우기 (그 사이에 중단되면 저널 항목이 인덱스와 중복될 뿐)
+        write_atomic(self.index_path, bytes(out))
+        self.journal_file.truncate(0)
+        self.journal = {}
+        self._journal_read = 0
+        self._load_index()
+
+    def close(self):
+        self.compact()
+        self.segment_file.close()
+        self.journal_file.close()
+        super().close()
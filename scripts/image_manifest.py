@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+HiKo 이미지 처리 매니페스트 저장소
+processed_images.json을 대체하는 SQLite 기반 처리 기록 (크래시 안전, 주기적 체크포인트)
+"""
+
+import json
+import sqlite3
+from pathlib import Path
+
+# 이 횟수만큼 기록할 때마다 커밋 (크래시 시 최대 손실 범위)
+CHECKPOINT_INTERVAL = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    path TEXT PRIMARY KEY,
+    hotdeal_id TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_hotdeal_id ON entries (hotdeal_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+def merge_links(*entries):
+    """
+    여러 기록의 핫딜 연결 합치기
+    반환값: (모든 사이즈가 연결된 핫딜 목록, {일부 사이즈만 연결된 핫딜: 사이즈 목록})
+    """
+    linked = set()
+    partial = {}
+    for entry in entries:
+        linked.update(entry.get("linked_ids", []))
+        for hotdeal_id, sizes in entry.get("partial_links", {}).items():
+            partial.setdefault(hotdeal_id, set()).update(sizes)
+    return sorted(linked), {hotdeal_id: sorted(sizes) for hotdeal_id, sizes in sorted(partial.items())
+                            if hotdeal_id not in linked}
+
+class ManifestStore:
+    """
+    경로 -> 처리 기록(dict) 매핑을 SQLite에 저장하는 dict 호환 저장소
+    read_only이면 쓰기는 메모리에만 보관 (워커 프로세스용, 부모가 결과를 기록)
+    """
+
+    def __init__(self, db_path, legacy_json=None, read_only=False):
+        self.db_path = Path(db_path)
+        self.read_only = read_only
+        self.pending_writes = 0
+        self.overlay = {}
+
+        if not read_only:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self.conn = sqlite3.connect(str(self.db_path), timeout=30)
+        elif str(db_path) == ":memory:":
+            self.conn = sqlite3.connect(":memory:")
+        else:
+            # 읽기 전용은 없는 경로에 빈 파일을 만들지 않도록 mode=ro로 열기
+            if not self.db_path.exists():
+                raise FileNotFoundError(f"매니페스트를 찾을 수 없음: {self.db_path}")
+            self.conn = sqlite3.connect(f"{self.db_path.resolve().as_uri()}?mode=ro", uri=True, timeout=30)
+
+        if not read_only:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(SCHEMA)
+            if legacy_json is not None:
+                self.import_json(legacy_json)
+
+    def import_json(self, json_path, force=False):
+        """기존 processed_images.json 가져오기 (최초 1회)"""
+        json_path = Path(json_path)
+        if not json_path.exists():
+            return 0
+
+        marker = f"imported:{json_path.resolve()}"
+        if not force and self._get_meta(marker):
+            return 0
+
+        with open(json_path, 'r') as f:
+            entries = json.load(f)
+
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO entries (path, hotdeal_id, data) VALUES (?, ?, ?)",
+            [(path, entry.get("hotdeal_id"), json.dumps(entry)) for path, entry in entries.items()]
+        )
+        self._set_meta(marker, "1")
+        self.conn.commit()
+        print(f"✓ 기존 처리 로그 가져오기: {json_path} ({len(entries)}개)")
+        return len(entries)
+
+    def export_json(self, json_path):
+        """JSON 형식으로 내보내기 (호환/디버깅용)"""
+        json_path = Path(json_path)
+        json_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(json_path, 'w') as f:
+            json.dump(dict(self.items()), f, indent=2)
+
+    def _get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def get(self, path, default=None):
+        if path in self.overlay:
+            return self.overlay[path]
+        row = self.conn.execute("SELECT data FROM entries WHERE path = ?", (path,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def __getitem__(self, path):
+        entry = self.get(path)
+        if entry is None:
+            raise KeyError(path)
+        return entry
+
+    def __contains__(self, path):
+        return self.get(path) is not None
+
+    def __setitem__(self, path, entry):
+        if self.read_only:
+            self.overlay[path] = entry
+            return
+
+        self.conn.execute(
+            "INSERT OR REPLACE INTO entries (path, hotdeal_id, data) VALUES (?, ?, ?)",
+            (path, entry.get("hotdeal_id"), json.dumps(entry))
+        )
+        self.pending_writes += 1
+        if self.pending_writes >= CHECKPOINT_INTERVAL:
+            self.checkpoint()
+
+    def __delitem__(self, path):
+        self.overlay.pop(path, None)
+        if not self.read_only:
+            self.conn.execute("DELETE FROM entries WHERE path = ?", (path,))
+            self.pending_writes += 1
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def update(self, entries):
+        for path, entry in entries.items():
+            self[path] = entry
+
+    def merge_from(self, other_path):
+        """
+        다른 매니페스트(샤드별 처리 결과)의 기록을 합침 - 합친 항목 수 반환
+        같은 경로가 양쪽에 있으면 원본 해시가 같을 때 연결된 핫딜을 합치고(처음 처리한 핫딜 유지),
+        다르면 나중에 처리한 기록을 사용 (이전 원본에 연결됐던 핫딜은 다음 처리 때 다시 링크됨)
+        """
+        other = ManifestStore(other_path, read_only=True)
+        merged = 0
+        try:
+            tables = other.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'entries'")
+            if tables.fetchone() is None:
+                raise ValueError(f"처리 기록 매니페스트가 아님 (entries 테이블 없음): {other_path}")
+            for path, record in other.items():
+                current = self.get(path)
+                if current is not None:
+                    older, record = sorted((current, record), key=lambda entry: entry.get("processed_at", ""))
+                    if older.get("hash") == record.get("hash"):
+                        linked_ids, partial_links = merge_links(older, record)
+                        record = dict(record, hotdeal_id=older.get("hotdeal_id"), linked_ids=linked_ids,
+                                      partial_links=partial_links)
+                    if record == current:
+                        continue
+                self[path] = record
+                merged += 1
+        finally:
+            other.close()
+        self.checkpoint()
+        return merged
+
+    def find_by_hotdeal_id(self, hotdeal_id):
+        """핫딜 ID의 원본 경로 - 처음 처리한 핫딜(인덱스) 우선, 없으면 linked_ids/partial_links 검색 (오버레이는 제외)"""
+        row = self.conn.execute("SELECT path FROM entries WHERE hotdeal_id = ? LIMIT 1", (hotdeal_id,)).fetchone()
+        if row is None:
+            row = self.conn.execute(
+                "SELECT entries.path FROM entries, json_each(entries.data, '$.linked_ids') "
+                "WHERE json_each.value = ? LIMIT 1",
+                (hotdeal_id,)
+            ).fetchone()
+        if row is None:
+            row = self.conn.execute(
+                "SELECT entries.path FROM entries, json_each(entries.data, '$.partial_links') "
+                "WHERE json_each.key = ? LIMIT 1",
+                (hotdeal_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def items(self):
+        """(경로, 기록) 순회 - 전체를 메모리에 올리지 않고 스트리밍"""
+        for path, data in self.conn.execute("SELECT path, data FROM entries"):
+            yield path, json.loads(data)
+
+    def checkpoint(self):
+        """지금까지의 기록을 디스크에 커밋"""
+        if not self.read_only:
+            self.conn.commit()
+        self.pending_writes = 0
+
+    def close(self):
+        self.checkpoint()
+        self.conn.close()
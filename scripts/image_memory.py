@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+HiKo 이미지 처리 메모리 거버너
+워커 프로세스들이 공유하는 메모리 예산으로 이미지별 작업 메모리를 승인하고, 이미지별 최대 RSS를 측정
+"""
+
+import multiprocessing
+import resource
+import sys
+from contextlib import contextmanager
+
+class MemoryGovernor:
+    """
+    프로세스 간 공유 메모리 예산
+    이미지마다 예상 작업 메모리(prepare_decode 결과)를 확보한 뒤 처리하고, 끝나면 반납
+    예산보다 큰 작업은 진행 중인 작업이 없을 때만 단독으로 승인 (교착 방지)
+    프로세스 풀 initializer 인자로 넘겨서 워커들이 같은 예산을 공유
+    """
+
+    def __init__(self, limit_bytes, context=None):
+        context = context or multiprocessing.get_context()
+        self.limit_bytes = limit_bytes
+        self.in_use = context.Value('q', 0, lock=False)
+        self.condition = context.Condition()
+
+    @contextmanager
+    def admit(self, nbytes):
+        with self.condition:
+            while self.in_use.value > 0 and self.in_use.value + nbytes > self.limit_bytes:
+                self.condition.wait()
+            self.in_use.value += nbytes
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.in_use.value -= nbytes
+                self.condition.notify_all()
+
+def reset_peak_rss():
+    """최대 RSS 초기화 (Linux: /proc/self/clear_refs) - 지원하지 않으면 False"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def read_peak_rss():
+    """최대 RSS (바이트) - /proc의 VmHWM, 없으면 프로세스 전체 최대값(getrusage)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS는 바이트, Linux는 KB 단위
+    return peak if sys.platform == "darwin" else peak * 1024
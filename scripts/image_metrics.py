@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+HiKo 이미지 처리 단계별 계측
+단계(해시/디코드/변환/리사이즈/인코딩/쓰기) x 프리셋별 소요 시간 히스토그램을 모으고
+JSON 보고서와 Prometheus textfile collector 형식으로 내보냄 (워커 결과는 dict로 합산)
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+# 히스토그램 버킷 상한 (초) - 마지막 +Inf 버킷은 자동 추가
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# 프리셋과 무관한 단계(원본 해시 확인, 디코드 등)의 프리셋 라벨
+SOURCE_PRESET = "source"
+
+# Prometheus 지표 이름 접두어
+METRIC_PREFIX = "hiko_image"
+
+class StageMetrics:
+    """
+    (단계, 프리셋)별 소요 시간 히스토그램
+    stages: {단계: {프리셋: {"count", "sum", "max", "buckets"(버킷별 비누적 개수)}}}
+    여러 스레드(이미지 서버의 요청 스레드 등)가 함께 기록/조회할 수 있도록 갱신과 스냅샷은 잠금 안에서 수행
+    """
+
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    def _series(self, stage, preset):
+        presets = self.stages.setdefault(stage, {})
+        if preset not in presets:
+            presets[preset] = {"count": 0, "sum": 0.0, "max": 0.0, "buckets": [0] * (len(self.buckets) + 1)}
+        return presets[preset]
+
+    def observe(self, stage, seconds, preset=SOURCE_PRESET):
+        for index, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                break
+        else:
+            index = len(self.buckets)
+        with self.lock:
+            series = self._series(stage, preset)
+            series["count"] += 1
+            series["sum"] += seconds
+            series["max"] = max(series["max"], seconds)
+            series["buckets"][index] += 1
+
+    @contextmanager
+    def time(self, stage, preset=SOURCE_PRESET):
+        """with 블록의 소요 시간을 기록"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, preset)
+
+    def timer(self, preset):
+        """프리셋을 고정한 타이머 (save_formats 등 공통 헬퍼에 전달용)"""
+        return lambda stage: self.time(stage, preset)
+
+    def snapshot(self):
+        """현재 히스토그램 복사본 (다른 스레드가 기록 중이어도 일관된 값)"""
+        with self.lock:
+            return {
+                stage: {preset: dict(series, buckets=list(series["buckets"])) for preset, series in presets.items()}
+                for stage, presets in self.stages.items()
+            }
+
+    def to_dict(self):
+        return {"buckets": list(self.buckets), "stages": self.snapshot()}
+
+    def merge(self, other):
+        """다른 프로세스(워커)의 to_dict() 결과 합산"""
+        if list(other["buckets"]) != list(self.buckets):
+            raise ValueError("히스토그램 버킷 구성이 다름")
+        with self.lock:
+            for stage, presets in other["stages"].items():
+                for preset, incoming in presets.items():
+                    series = self._series(stage, preset)
+                    series["count"] += incoming["count"]
+                    series["sum"] += incoming["sum"]
+                    series["max"] = max(series["max"], incoming["max"])
+                    series["buckets"] = [a + b for a, b in zip(series["buckets"], incoming["buckets"])]
+
+    def reset(self):
+        with self.lock:
+            self.stages = {}
+
+    def stage_totals(self):
+        """단계별 (횟수, 합계 초) - 프리셋 합산"""
+        return {
+            stage: (sum(s["count"] for s in presets.values()), sum(s["sum"] for s in presets.values()))
+            for stage, presets in self.snapshot().items()
+        }
+
+    def write_json(self, path, stats=None):
+        """JSON 보고서 저장 (요약값 + 원본 버킷)"""
+        stages = {}
+        for stage, presets in self.snapshot().items():
+            stages[stage] = {
+                preset: {
+                    "count": series["count"],
+                    "sum_seconds": round(series["sum"], 6),
+                    "mean_ms": round(series["sum"] / series["count"] * 1000, 3) if series["count"] else 0.0,
+                    "max_ms": round(series["max"] * 1000, 3),
+                    "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], series["buckets"])),
+                }
+                for preset, series in presets.items()
+            }
+
+        report = {"generated_at": datetime.now().isoformat(), "stats": stats or {}, "stages": stages}
+        _atomic_write(path, json.dumps(report, indent=2, ensure_ascii=False))
+
+    def write_prometheus(self, path, stats=None):
+        """Prometheus textfile collector 형식 저장 (수집기가 쓰다 만 파일을 읽지 않도록 원자적 교체)"""
+        name = f"{METRIC_PREFIX}_stage_duration_seconds"
+        lines = [
+            f"# HELP {name} Image processing stage duration by preset.",
+            f"# TYPE {name} histogram",
+        ]
+        for stage, presets in sorted(self.snapshot().items()):
+            for preset, series in sorted(presets.items()):
+                labels = f'stage="{stage}",preset="{preset}"'
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["buckets"]):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {series["count"]}')
+                lines.append(f"{name}_sum{{{labels}}} {series['sum']:.6f}")
+                lines.append(f"{name}_count{{{labels}}} {series['count']}")
+
+        for key, value in sorted((stats or {}).items()):
+            metric = f"{METRIC_PREFIX}_{key}"
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {value}")
+
+        _atomic_write(path, "\n".join(lines) + "\n")
+
+def _atomic_write(path, text):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
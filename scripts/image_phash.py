@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+HiKo 이미지 지각 해시(dHash) 인덱스
+재인코딩/리사이즈/워터마크 정도만 다른 원본을 해밍 거리로 찾기 위한 BK-트리
+"""
+
+from PIL import Image
+
+# dHash 크기 - 가로/세로 방향 각각 HASH_SIZE x HASH_SIZE 비트 (합계 128비트)
+HASH_SIZE = 8
+HASH_BITS = HASH_SIZE * HASH_SIZE * 2
+# 방향별로 켜진/꺼진 비트가 각각 이 개수 이상이어야 유사 판정에 사용 (단색/그라디언트는 해시가 거의 같음)
+MIN_HASH_BITS = 8
+
+def dhash(img):
+    """
+    차이 해시 - 그레이스케일 (HASH_SIZE+1) x (HASH_SIZE+1) 축소 후 이웃한 픽셀의 밝기 비교
+    가로 방향 비트 뒤에 세로 방향 비트를 붙임 (한 방향으로만 변하는 그라디언트/배너 이미지끼리 같은 해시가 되지 않도록)
+    반환값: HASH_BITS비트 정수
+    """
+    side = HASH_SIZE + 1
+    pixels = img.convert('L').resize((side, side), Image.Resampling.BOX).tobytes()
+    value = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            offset = row * side + col
+            value = (value << 1) | (pixels[offset + 1] > pixels[offset])
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            offset = row * side + col
+            value = (value << 1) | (pixels[offset + side] > pixels[offset])
+    return value
+
+def is_distinctive(value):
+    """유사 판정에 쓸 만한 해시인지 - 단색/한 방향 그라디언트처럼 밝기 변화가 없는 이미지는 제외"""
+    half_bits = HASH_SIZE * HASH_SIZE
+    for half in (value >> half_bits, value & ((1 << half_bits) - 1)):
+        ones = bin(half).count("1")
+        if ones < MIN_HASH_BITS or half_bits - ones < MIN_HASH_BITS:
+            return False
+    return True
+
+def dhash_file(path):
+    """파일에서 바로 dHash 계산 - JPEG은 가장 작은 축소 디코드(1/8)로 읽음"""
+    with Image.open(path) as img:
+        img.draft('RGB', (HASH_SIZE * 8, HASH_SIZE * 8))
+        return dhash(img)
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+def format_hash(value):
+    return f"{value:0{HASH_BITS // 4}x}"
+
+def parse_hash(text):
+    return int(text, 16)
+
+class BKTree:
+    """
+    해밍 거리 BK-트리 - 거리 d 이내 검색 시 삼각 부등식으로 가지치기
+    노드: [해시, 항목 목록, {거리: 자식 노드}]
+    """
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, value, item):
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value, max_distance):
+        """거리 max_distance 이내의 [(거리, 항목), ...] - 가까운 순"""
+        results = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= max_distance:
+                results.extend((distance, item) for item in node[1])
+            for edge, child in node[2].items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        results.sort(key=lambda result: result[0])
+        return results
+
+    def __len__(self):
+        return self.size